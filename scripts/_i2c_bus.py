@@ -0,0 +1,23 @@
+"""
+Shared I2C bus handle for the TMF8820 helper scripts.
+
+The first open_bus(n) opens /dev/i2c-n and waits 0.5s for the bus to settle;
+later calls in the same process (e.g. a harness running calibration and then
+diagnostics) reuse that handle instead of re-opening and re-settling.
+The bus is closed at interpreter exit.
+"""
+
+import atexit
+import functools
+import time
+
+from smbus2 import SMBus  # type: ignore
+
+
+@functools.lru_cache(maxsize=None)
+def open_bus(bus_num: int) -> SMBus:
+    # force=True: talk to the sensor even if a kernel driver has claimed the address.
+    bus = SMBus(bus_num, force=True)
+    atexit.register(bus.close)
+    time.sleep(0.5)  # match working code: delay after opening I2C bus
+    return bus
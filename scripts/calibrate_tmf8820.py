@@ -37,7 +37,7 @@ def main() -> int:
     args = parser.parse_args()
 
     try:
-        from smbus2 import SMBus  # type: ignore
+        from _i2c_bus import open_bus
         from tmf882x import TMF882x, TMF882xException  # type: ignore
     except ImportError as e:
         print("Error: tmf882x-driver is required. Install with:", file=sys.stderr)
@@ -50,15 +50,13 @@ def main() -> int:
     print()
 
     try:
-        bus = SMBus(args.bus)
-        time.sleep(0.5)  # match working code: delay after opening I2C bus
+        bus = open_bus(args.bus)  # settles once per process; closed at exit
         tof = TMF882x(bus, address=args.address)
         tof.enable()
         time.sleep(0.5)  # match working code: delay after enable
         print("Running calibration (this may take a few seconds)...")
         cal_bytes = tof.calibrate()
         tof.standby()
-        bus.close()
     except TMF882xException as e:
         print("TMF8820 error:", e, file=sys.stderr)
         return 1
@@ -5,10 +5,12 @@ Run on the Pi with the sensor connected. No config needed.
 
   python3 scripts/tof_diagnose.py
   python3 scripts/tof_diagnose.py -n 20   # print 20 samples then exit
+  python3 scripts/tof_diagnose.py --hz 0  # measure back-to-back (no pacing)
 """
 
 import argparse
 import sys
+import time
 
 
 def main() -> int:
@@ -16,46 +18,68 @@ def main() -> int:
     parser.add_argument("-n", "--samples", type=int, default=0, help="Number of samples (0 = forever)")
     parser.add_argument("-b", "--bus", type=int, default=1, help="I2C bus")
     parser.add_argument("-a", "--address", type=int, default=0x41, help="I2C address")
+    parser.add_argument(
+        "--hz",
+        type=float,
+        default=8.0,
+        help="Samples per second, like sensor.poll_hz (default 8; 0 = as fast as possible)",
+    )
     args = parser.parse_args()
 
     try:
-        from smbus2 import SMBus  # type: ignore
+        import numpy as np  # type: ignore
+        from _i2c_bus import open_bus
         from tmf882x import TMF882x, TMF882xException  # type: ignore
     except ImportError:
-        print("Install: pip install tmf882x-driver", file=sys.stderr)
+        print("Install: pip install numpy tmf882x-driver", file=sys.stderr)
         return 1
+    try:
+        # Whole result page in one I2C transaction when lego_cam is installed.
+        from lego_cam.sensors.tmf882x_fast import FastTMF882x as TMF882x
+    except ImportError:
+        pass
 
-    bus = SMBus(args.bus)
+    bus = open_bus(args.bus)  # shared per process; closed at exit
     tof = TMF882x(bus, address=args.address)
     tof.enable()
     print("TMF8820 raw diagnostic (bus=%s addr=0x%02X). Ctrl+C to stop.\n" % (args.bus, args.address))
 
+    period = 1.0 / args.hz if args.hz > 0 else 0.0
     n = 0
+    next_tick = time.monotonic()
     try:
         while True:
             m = tof.measure()
-            dists = []
-            confs = []
-            for r in m.results[:9]:  # first 9 = 3x3 grid
-                dists.append(r.distance)
-                confs.append(r.confidence)
-            dists = [d for d in dists if d > 0]
-            confs = [c for c in confs if c > 0]
-            median_d = sorted(dists)[len(dists) // 2] if dists else 0
-            avg_c = sum(confs) / len(confs) if confs else 0
+            zones = m.results[:9]  # first 9 = 3x3 grid
+            dists = np.fromiter((r.distance for r in zones), dtype=np.int32, count=len(zones))
+            confs = np.fromiter((r.confidence for r in zones), dtype=np.int32, count=len(zones))
+            dists = dists[dists > 0]
+            confs = confs[confs > 0]
+            # Upper median via O(n) selection instead of a full sort.
+            k = dists.size // 2
+            median_d = int(np.partition(dists, k)[k]) if dists.size else 0
+            avg_c = float(confs.mean()) if confs.size else 0
             print(
                 "  distance_mm: min=%s median=%s max=%s  confidence: avg=%.1f  (zones with d>0: %s)"
                 % (
-                    min(dists) if dists else "n/a",
+                    dists.min() if dists.size else "n/a",
                     median_d,
-                    max(dists) if dists else "n/a",
+                    dists.max() if dists.size else "n/a",
                     avg_c,
-                    len(dists),
+                    dists.size,
                 )
             )
             n += 1
             if args.samples and n >= args.samples:
                 break
+            if period:
+                # Drift-free pacing: keep I2C traffic at --hz regardless of measure() time.
+                next_tick += period
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_tick = time.monotonic()
     except KeyboardInterrupt:
         pass
     except TMF882xException as e:
@@ -63,7 +87,6 @@ def main() -> int:
         return 1
     finally:
         tof.standby()
-        bus.close()
 
     return 0
 
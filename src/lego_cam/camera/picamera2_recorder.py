@@ -1,32 +1,194 @@
 from __future__ import annotations
 
 import asyncio
+import io
 import logging
-import subprocess
-from dataclasses import dataclass
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any
 
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    # Without numpy there is no vision motion detection to feed.
+    np = None
+
 
 log = logging.getLogger(__name__)
 
 
+# Linux fcntl command to resize a pipe (fcntl.F_SETPIPE_SZ on Python 3.10+).
+_F_SETPIPE_SZ = 1031
+_PIPE_SIZES = (1024 * 1024, 512 * 1024, 256 * 1024)
+# Encoded video buffered in-process ahead of ffmpeg (~50s at 10 Mbps).
+_PIPE_BUFFER_BYTES = 64 * 1024 * 1024
+# Coalesce small encoder frames into writes of up to this size.
+_PIPE_WRITE_CHUNK = 1024 * 1024
+
+
 def _utc_stamp() -> str:
     return datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
 
 
+def _enlarge_pipe(fd: int) -> int | None:
+    """
+    Grow the kernel buffer of the pipe behind fd (default 64 KB) so short ffmpeg
+    stalls don't back-pressure the encoder. Returns the new size, or None.
+    """
+    try:
+        import fcntl
+    except ImportError:  # pragma: no cover - non-Linux dev machines
+        return None
+    cmd = getattr(fcntl, "F_SETPIPE_SZ", _F_SETPIPE_SZ)
+    for size in _PIPE_SIZES:
+        try:
+            return fcntl.fcntl(fd, cmd, size)
+        except OSError:
+            # EPERM above /proc/sys/fs/pipe-max-size; try the next size down.
+            continue
+    return None
+
+
+def _is_h264_keyframe(frame: bytes) -> bool:
+    """True if an Annex-B access unit starts with SPS or IDR (encoder uses repeat=True)."""
+    head = bytes(frame[:5])
+    if head[:4] == b"\x00\x00\x00\x01":
+        nal = head[4]
+    elif head[:3] == b"\x00\x00\x01":
+        nal = head[3]
+    else:
+        return False
+    return (nal & 0x1F) in (5, 7)
+
+
+class _PipeWriter(io.BufferedIOBase):
+    """
+    File-like sink for FileOutput that decouples the encoder from ffmpeg.
+    FileOutput only accepts io.BufferedIOBase (or a path/socket), hence the base class.
+
+    write() only appends the frame to a bounded in-memory queue; a writer thread
+    drains it into the (blocking) pipe in ~1 MB os.write calls. If ffmpeg falls so
+    far behind that the queue is full, frames are dropped until the next keyframe
+    so the stream stays decodable instead of stalling the camera.
+    """
+
+    def __init__(self, fd: int, max_bytes: int = _PIPE_BUFFER_BYTES) -> None:
+        super().__init__()
+        self._fd = fd
+        self._max_bytes = max_bytes
+        self._queue: deque[bytes] = deque()
+        self._queued_bytes = 0
+        self._dropping = False
+        self._dropped = 0
+        self._closed = False
+        self._broken = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="ffmpeg-stdin", daemon=True)
+        self._thread.start()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, frame: bytes) -> int:  # type: ignore[override]
+        n = len(frame)
+        with self._cond:
+            if self._closed or self._broken:
+                return n
+            fits = self._queued_bytes + n <= self._max_bytes
+            if self._dropping and fits and _is_h264_keyframe(frame):
+                log.warning("ffmpeg caught up; resumed after dropping %d frames", self._dropped)
+                self._dropping = False
+                self._dropped = 0
+            if self._dropping or not fits:
+                if not self._dropping:
+                    log.warning("ffmpeg is not keeping up; dropping frames until next keyframe")
+                    self._dropping = True
+                self._dropped += 1
+                return n
+            self._queue.append(bytes(frame))
+            self._queued_bytes += n
+            self._cond.notify()
+        return n
+
+    def flush(self) -> None:
+        # Writes are handed to the writer thread; there is nothing to flush here.
+        pass
+
+    def close(self) -> None:
+        """
+        Stop accepting frames; the writer thread drains the queue, then closes the fd.
+        Never blocks: if ffmpeg has stalled, terminating it fails the pending write.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        super().close()
+
+    def join(self, timeout: float | None = None) -> bool:
+        """Wait for the queued video to reach the pipe; True once the fd is closed."""
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _run(self) -> None:
+        # Only this thread closes the fd: closing it under a blocked os.write would
+        # let the number be reused by another file that then receives stray video.
+        try:
+            self._drain()
+        finally:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+
+    def _drain(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                chunks = []
+                size = 0
+                while self._queue and size < _PIPE_WRITE_CHUNK:
+                    chunk = self._queue.popleft()
+                    chunks.append(chunk)
+                    size += len(chunk)
+                self._queued_bytes -= size
+            data = memoryview(b"".join(chunks))
+            try:
+                while data:
+                    data = data[os.write(self._fd, data) :]
+            except OSError as e:
+                # ffmpeg exited (EPIPE) or the fd is gone: discard everything from now on.
+                log.error("Writing to ffmpeg failed: %s", e)
+                with self._cond:
+                    self._broken = True
+                    self._queue.clear()
+                    self._queued_bytes = 0
+                return
+
+
 @dataclass
 class Picamera2Recorder:
     """
     Picamera2 video recorder with 30s segmentation.
 
-    Two modes:
+    Modes:
     - rotation_mode=rotate: create a new raw H.264 file every segment_seconds by
-      switching Picamera2 FileOutput targets. These files typically have a .h264
-      extension and can be remuxed to MP4 with ffmpeg.
+      switching the file target of a Picamera2 CircularOutput (the encoder keeps
+      running). These files typically have a .h264 extension and can be remuxed to
+      MP4 with ffmpeg.
     - rotation_mode=ffmpeg_segment: pipe raw H.264 to an external ffmpeg segment muxer
       for seamless MP4 segments. (Requires ffmpeg on the system path.)
+    - rotation_mode=pyav_segment: mux MP4 segments in-process with PyAV (libavformat),
+      with no ffmpeg process or pipe copy. (Requires python3-av.)
     """
 
     output_dir: Path
@@ -37,24 +199,51 @@ class Picamera2Recorder:
     segment_seconds: int
     # When true, show a live preview window on the attached display (developer mode).
     developer_mode: bool = False
+    # Scale the motion (lores) stream down by this factor in the ISP (1 = full size).
+    motion_stride: int = 4
+    # Stash at most this many motion frames per second (<= 0 = every frame).
+    motion_fps: int = 0
+    # Camera -> app request queue depth; more buffers ride out short app stalls.
+    buffer_count: int = 6
 
     _picam2: Any | None = None
     _encoder: Any | None = None
     _running: bool = False
     _rotate_task: asyncio.Task[None] | None = None
-    _ffmpeg_proc: subprocess.Popen[bytes] | None = None
-    _latest_motion_frame: Any | None = None
-    _motion_frame_lock: asyncio.Lock = asyncio.Lock()
+    _ffmpeg_proc: asyncio.subprocess.Process | None = None
+    # Buffered writer for ffmpeg's stdin, fed by the encoder thread (not asyncio).
+    _ffmpeg_stdin: _PipeWriter | None = None
+    _ffmpeg_stderr_task: asyncio.Task[None] | None = None
+    _mapped_array: Any | None = None
+    # (width, height) of the streams as actually configured (after alignment).
+    _main_size: tuple[int, int] = (0, 0)
+    _motion_size: tuple[int, int] = (0, 0)
+    # Segment files are named <_session_stamp>_<_segment_idx>.
+    _session_stamp: str = ""
+    _segment_idx: int = 0
+    # Motion frame triple buffer: the camera thread fills the write slot and swaps it
+    # with the ready slot; the consumer swaps ready with read, so neither side waits.
+    _motion_bufs: list[Any] | None = None
+    _motion_write_idx: int = 0
+    _motion_ready_idx: int = 1
+    _motion_read_idx: int = 2
+    _motion_fresh: bool = False
+    _motion_swap_lock: threading.Lock = field(default_factory=threading.Lock)
+    _motion_period_ns: int = 0
+    _last_motion_stash_ns: int = 0
 
     async def start(self) -> None:
         if self._running:
             return
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        # Segment files are named <session start>_<index>, so the clock is read once per session.
+        self._session_stamp = _utc_stamp()
+        self._segment_idx = 0
 
         try:
-            from picamera2 import Picamera2  # type: ignore
+            from picamera2 import MappedArray, Picamera2  # type: ignore
             from picamera2.encoders import H264Encoder  # type: ignore
-            from picamera2.outputs import FileOutput  # type: ignore
+            from picamera2.outputs import CircularOutput, FileOutput  # type: ignore
         except Exception as e:
             raise RuntimeError(
                 "Picamera2 is required on Raspberry Pi OS. "
@@ -62,14 +251,33 @@ class Picamera2Recorder:
             ) from e
 
         self._picam2 = Picamera2()
+        self._mapped_array = MappedArray
 
+        # The lores YUV420 stream is only used for motion detection: its first
+        # plane is the luma (Y) image, so the callback never has to touch RGB.
+        # The ISP scales it by motion_stride, so the callback copies it as is.
+        step = max(1, self.motion_stride)
+        lores_size = (max(2, self.width // step), max(2, self.height // step))
         video_config = self._picam2.create_video_configuration(
             main={"size": (self.width, self.height), "format": "RGB888"},
+            lores={"size": lores_size, "format": "YUV420"},
             controls={"FrameRate": self.fps},
+            buffer_count=self.buffer_count,
+            queue=True,
         )
+        # Let libcamera round sizes to what the ISP prefers (avoids padded strides).
+        self._picam2.align_configuration(video_config)
         self._picam2.configure(video_config)
+        self._main_size = tuple(video_config["main"]["size"])
+        self._motion_size = tuple(video_config["lores"]["size"])
+
+        self._motion_bufs = self._alloc_motion_bufs()
+        self._motion_period_ns = int(1e9 / self.motion_fps) if self.motion_fps > 0 else 0
+        self._last_motion_stash_ns = 0
 
-        self._encoder = H264Encoder(bitrate=10_000_000)
+        # One IDR (with SPS/PPS repeated) per second, so every segmenting mode can
+        # start a new file within a second of the segment boundary.
+        self._encoder = H264Encoder(bitrate=10_000_000, repeat=True, iperiod=self.fps)
         
         # Store frames for motion detection (controller will sample while recording).
         # Set callback after encoder is ready but before starting camera
@@ -95,8 +303,10 @@ class Picamera2Recorder:
 
         if self.rotation_mode == "ffmpeg_segment":
             await self._start_ffmpeg_segmenting(FileOutput)
+        elif self.rotation_mode == "pyav_segment":
+            await self._start_pyav_segmenting()
         else:
-            await self._start_rotate_outputs(FileOutput)
+            await self._start_rotate_outputs(CircularOutput)
 
         self._running = True
         log.info("Camera recording started (mode=%s)", self.rotation_mode)
@@ -115,92 +325,171 @@ class Picamera2Recorder:
             self._rotate_task = None
 
         if self._picam2 is not None:
-            try:
-                if hasattr(self._picam2, 'recording') and self._picam2.recording:
-                    self._picam2.stop_recording()
-            except Exception:
-                pass
-            try:
-                self._picam2.stop()
-            except Exception:
-                pass
-            try:
-                self._picam2.close()
-            except Exception:
-                pass
+            # stop_recording() blocks on the outputs (PyAV's faststart rewrite,
+            # _PipeWriter draining), so keep it off the event loop.
+            await asyncio.to_thread(self._release_camera, self._picam2)
             # Small delay to ensure hardware is released
             await asyncio.sleep(0.1)
             # Ensure camera hardware is fully released
             self._picam2 = None
 
-        if self._ffmpeg_proc is not None:
+        await self._stop_ffmpeg()
+
+        self._picam2 = None
+        self._encoder = None
+        self._motion_bufs = None
+        log.info("Camera recording stopped")
+
+    @staticmethod
+    def _release_camera(picam2: Any) -> None:
+        """Stop recording and close the camera (blocking; run in a worker thread)."""
+        try:
+            if hasattr(picam2, 'recording') and picam2.recording:
+                picam2.stop_recording()
+        except Exception:
+            pass
+        try:
+            picam2.stop()
+        except Exception:
+            pass
+        try:
+            picam2.close()
+        except Exception:
+            pass
+
+    async def _stop_ffmpeg(self) -> None:
+        """Close ffmpeg's stdin, reap the process and its stderr task (whatever exists)."""
+        stdin = self._ffmpeg_stdin
+        if stdin is not None:
+            # Close stdin so ffmpeg can flush and finalize segments: let queued video
+            # reach the pipe, then terminate ffmpeg below, which fails a write still
+            # blocked on a stalled ffmpeg with EPIPE so the writer exits.
+            self._ffmpeg_stdin = None
             try:
-                # Close stdin so ffmpeg can flush and finalize segments.
-                if self._ffmpeg_proc.stdin is not None:
-                    try:
-                        self._ffmpeg_proc.stdin.close()
-                    except Exception:
-                        pass
+                stdin.close()
+                if not await asyncio.to_thread(stdin.join, 3.0):
+                    log.warning("ffmpeg stdin still blocked after 3s; terminating ffmpeg")
+            except Exception:
+                pass
 
+        if self._ffmpeg_proc is not None:
+            try:
                 self._ffmpeg_proc.terminate()
-                self._ffmpeg_proc.wait(timeout=3)
-            except Exception:
+                try:
+                    await asyncio.wait_for(self._ffmpeg_proc.wait(), timeout=3.0)
+                except asyncio.TimeoutError:
+                    log.warning("ffmpeg did not exit after SIGTERM; killing it")
+                    self._ffmpeg_proc.kill()
+                    await self._ffmpeg_proc.wait()
+            except ProcessLookupError:
                 pass
+            except Exception:
+                log.exception("Error stopping ffmpeg")
             finally:
                 self._ffmpeg_proc = None
 
-        self._picam2 = None
-        self._encoder = None
-        log.info("Camera recording stopped")
+        if stdin is not None and not await asyncio.to_thread(stdin.join, 1.0):
+            log.warning("ffmpeg stdin writer did not exit; leaving its fd open")
+
+        if self._ffmpeg_stderr_task is not None:
+            # stderr hits EOF once ffmpeg exits; cancel in case it never started.
+            self._ffmpeg_stderr_task.cancel()
+            try:
+                await self._ffmpeg_stderr_task
+            except asyncio.CancelledError:
+                pass
+            self._ffmpeg_stderr_task = None
 
     async def get_motion_frame(self) -> Any | None:
         """
-        Returns a recent RGB frame for lightweight motion detection.
+        Returns the newest grayscale (luma) frame for lightweight motion detection,
+        or None if no frame has arrived since the previous call. Re-running the
+        detector on a frame it has already seen can only ever report "no motion".
         """
-        if not self._running:
+        if not self._running or self._motion_bufs is None:
+            return None
+        with self._motion_swap_lock:
+            if not self._motion_fresh:
+                return None
+            self._motion_ready_idx, self._motion_read_idx = (
+                self._motion_read_idx,
+                self._motion_ready_idx,
+            )
+            self._motion_fresh = False
+        return self._motion_bufs[self._motion_read_idx]
+
+    def _alloc_motion_bufs(self) -> list[Any] | None:
+        if np is None:
             return None
-        async with self._motion_frame_lock:
-            return self._latest_motion_frame
+        self._motion_write_idx, self._motion_ready_idx, self._motion_read_idx = 0, 1, 2
+        self._motion_fresh = False
+        w, h = self._motion_size
+        return [np.empty((h, w), dtype=np.uint8) for _ in range(3)]
 
     def _pre_callback(self, request: Any) -> None:
         """
         Called by Picamera2 thread context.
-        Keep it lightweight: grab main image array and stash.
+        Keep it lightweight: map the lores buffer in place and copy only its Y plane.
+
+        The mapping is only valid until the request is released, so the luma
+        (already scaled down by the ISP) is copied into the preallocated write slot
+        (no per-frame allocation).
         """
+        bufs = self._motion_bufs
+        if bufs is None:
+            return
+        # The detector samples at motion_fps; don't copy frames it will never read.
+        now_ns = time.monotonic_ns()
+        if now_ns - self._last_motion_stash_ns < self._motion_period_ns:
+            return
+        self._last_motion_stash_ns = now_ns
+        w, h = self._motion_size
         try:
-            arr = request.make_array("main")
+            # Read-only: skips syncing the buffer back to the camera on exit.
+            with self._mapped_array(request, "lores", write=False) as m:
+                # YUV420 arrays are shaped (H * 3 // 2, stride); the first H rows are Y.
+                luma = m.array[:h, :w]
+                np.copyto(bufs[self._motion_write_idx], luma)
         except Exception:
             return
-        # Avoid blocking the camera thread on asyncio locks; best-effort set.
-        self._latest_motion_frame = arr
-
-    async def _start_rotate_outputs(self, FileOutput: Any) -> None:
+        with self._motion_swap_lock:
+            self._motion_write_idx, self._motion_ready_idx = (
+                self._motion_ready_idx,
+                self._motion_write_idx,
+            )
+            self._motion_fresh = True
+
+    async def _start_rotate_outputs(self, CircularOutput: Any) -> None:
+        """
+        Keep one encoder running for the whole session and switch the CircularOutput
+        file target every segment_seconds. The output only starts a file on a keyframe,
+        so each raw .h264 segment is independently decodable.
+        """
         assert self._picam2 is not None
         assert self._encoder is not None
 
         self._picam2.start()
 
+        segment_path = self._segment_path()
+        out = CircularOutput(file=str(segment_path), buffersize=self.fps * 2)
+        self._picam2.start_recording(self._encoder, out)
+        log.info("Started segment -> %s", segment_path.name)
+
         async def _rotator() -> None:
-            segment_num = 0
+            nonlocal segment_path
             while self._running:
-                segment_path = self._segment_path()
-                if segment_num > 0:
-                    # Add segment number to avoid collisions
-                    segment_path = self.output_dir / f"{_utc_stamp()}_{segment_num:03d}.h264"
-                
-                out = FileOutput(str(segment_path))
-                self._picam2.start_recording(self._encoder, out)
-                log.info("Started segment -> %s", segment_path.name)
-                
                 await asyncio.sleep(self.segment_seconds)
-                
-                if self._running:
-                    try:
-                        self._picam2.stop_recording()
-                        log.info("Rotated segment -> %s", segment_path.name)
-                    except Exception:
-                        log.exception("Failed stopping segment")
-                segment_num += 1
+                if not self._running:
+                    break
+                next_path = self._segment_path()
+                try:
+                    out.stop()
+                    out.fileoutput = str(next_path)
+                    out.start()
+                    log.info("Rotated segment %s -> %s", segment_path.name, next_path.name)
+                    segment_path = next_path
+                except Exception:
+                    log.exception("Failed rotating segment")
 
         self._rotate_task = asyncio.create_task(_rotator())
 
@@ -211,7 +500,7 @@ class Picamera2Recorder:
         assert self._picam2 is not None
         assert self._encoder is not None
 
-        pattern = str(self.output_dir / f"{_utc_stamp()}_%03d.mp4")
+        pattern = str(self.output_dir / f"{self._session_stamp}_%04d.mp4")
         cmd = [
             "ffmpeg",
             "-hide_banner",
@@ -237,22 +526,99 @@ class Picamera2Recorder:
             pattern,
         ]
 
-        self._ffmpeg_proc = subprocess.Popen(
-            cmd,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.PIPE,
+        # The encoder writes from its own thread, so it gets a plain blocking pipe
+        # rather than asyncio's (non-blocking) stdin transport. The event loop only
+        # supervises the process and its stderr.
+        read_fd, write_fd = os.pipe()
+        try:
+            self._ffmpeg_proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=read_fd,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except BaseException:
+            os.close(write_fd)
+            raise
+        finally:
+            os.close(read_fd)
+
+        # stop() is a no-op until start() completes, so a failure (or cancellation)
+        # from here on must release ffmpeg and the write end itself.
+        try:
+            self._attach_ffmpeg(write_fd, FileOutput)
+        except BaseException:
+            if self._ffmpeg_stdin is None:
+                # _PipeWriter owns (and closes) the fd once constructed.
+                os.close(write_fd)
+            await self._stop_ffmpeg()
+            raise
+
+    def _attach_ffmpeg(self, write_fd: int, FileOutput: Any) -> None:
+        assert self._picam2 is not None
+        assert self._ffmpeg_proc is not None
+
+        pipe_size = _enlarge_pipe(write_fd)
+        log.debug("ffmpeg stdin pipe size: %s", pipe_size or "default")
+        # The encoder only appends to an in-process buffer; a writer thread moves
+        # it into the pipe with raw os.write calls, so ffmpeg hiccups (e.g. slow
+        # SD-card flushes) never block the encoder thread. The raw fd can't go to
+        # FileOutput directly: an unbuffered file is an io.FileIO (RawIOBase), and
+        # FileOutput only accepts io.BufferedIOBase, which _PipeWriter is.
+        self._ffmpeg_stdin = _PipeWriter(write_fd)
+        # Nobody else reads stderr: if its pipe fills, ffmpeg stops reading stdin
+        # and the encoder stalls behind it.
+        self._ffmpeg_stderr_task = asyncio.create_task(
+            self._drain_stderr(self._ffmpeg_proc.stderr)
         )
-        if self._ffmpeg_proc.stdin is None:
-            raise RuntimeError("Failed to open ffmpeg stdin")
 
-        out = FileOutput(self._ffmpeg_proc.stdin)
+        out = FileOutput(self._ffmpeg_stdin)
         self._picam2.start()
         self._picam2.start_recording(self._encoder, out)
 
+    async def _start_pyav_segmenting(self) -> None:
+        """
+        Mux the H264 bitstream into mp4 segments inside this process.
+        """
+        assert self._picam2 is not None
+        assert self._encoder is not None
+
+        try:
+            from .pyav_segment_output import PyavSegmentOutput
+        except ImportError as e:
+            raise RuntimeError(
+                "rotation_mode=pyav_segment requires PyAV. Install via apt: "
+                "sudo apt install -y python3-av"
+            ) from e
+
+        out = PyavSegmentOutput(
+            next_path=self._segment_path,
+            fps=self.fps,
+            width=self._main_size[0],
+            height=self._main_size[1],
+            segment_seconds=self.segment_seconds,
+        )
+        self._picam2.start()
+        self._picam2.start_recording(self._encoder, out)
+
+    @staticmethod
+    async def _drain_stderr(stream: asyncio.StreamReader | None) -> None:
+        """Forward ffmpeg stderr to the log until the process closes it."""
+        if stream is None:
+            return
+        try:
+            while line := await stream.readline():
+                log.warning("ffmpeg: %s", line.decode("utf-8", "replace").rstrip())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass
+
     def _segment_path(self) -> Path:
-        # In rotate mode we write raw H.264 elementary streams; in ffmpeg_segment
-        # mode the external ffmpeg process produces MP4 segments.
-        ext = ".mp4" if self.rotation_mode == "ffmpeg_segment" else ".h264"
-        return self.output_dir / f"{_utc_stamp()}{ext}"
+        # In rotate mode we write raw H.264 elementary streams; the segmenting
+        # modes (external ffmpeg or in-process PyAV) produce MP4 segments.
+        ext = ".mp4" if self.rotation_mode in ("ffmpeg_segment", "pyav_segment") else ".h264"
+        path = self.output_dir / f"{self._session_stamp}_{self._segment_idx:04d}{ext}"
+        self._segment_idx += 1
+        return path
 
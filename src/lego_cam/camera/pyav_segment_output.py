@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from fractions import Fraction
+from pathlib import Path
+from typing import Any, Callable
+
+import av  # type: ignore
+from picamera2.outputs import Output  # type: ignore
+
+
+log = logging.getLogger(__name__)
+
+# Picamera2 encoder timestamps are in microseconds.
+_TIME_BASE = Fraction(1, 1_000_000)
+
+
+class PyavSegmentOutput(Output):
+    """
+    Picamera2 output that muxes the encoded H.264 stream into MP4 segments in-process
+    (libavformat via PyAV), replacing the external `ffmpeg -c copy -f segment` process.
+
+    A new file is opened on the first keyframe after segment_seconds have elapsed, so
+    every segment starts with an IDR frame (SPS/PPS are repeated inline by the encoder).
+    Finished containers are closed on a helper thread so writing the moov atom never
+    stalls the encoder thread.
+    """
+
+    def __init__(
+        self,
+        next_path: Callable[[], Path],
+        fps: int,
+        width: int,
+        height: int,
+        segment_seconds: int,
+    ) -> None:
+        super().__init__()
+        self._next_path = next_path
+        self._fps = fps
+        self._width = width
+        self._height = height
+        self._segment_us = int(segment_seconds * 1_000_000)
+        self._lock = threading.Lock()
+        self._container: Any | None = None
+        self._stream: Any | None = None
+        self._segment_start_us = 0
+        self._rotate_failures = 0
+
+    def outputframe(
+        self,
+        frame: bytes,
+        keyframe: bool = True,
+        timestamp: int | None = None,
+        packet: Any = None,
+        audio: bool = False,
+    ) -> None:
+        if audio or not self.recording:
+            return
+        if timestamp is None:
+            timestamp = time.monotonic_ns() // 1000
+        with self._lock:
+            if keyframe and (
+                self._container is None
+                or timestamp - self._segment_start_us >= self._segment_us
+            ):
+                self._rotate(timestamp)
+            if self._container is None:
+                # Waiting for the first keyframe.
+                return
+            pkt = av.Packet(frame)
+            pkt.stream = self._stream
+            pkt.time_base = _TIME_BASE
+            pkt.pts = pkt.dts = timestamp - self._segment_start_us
+            pkt.is_keyframe = keyframe
+            try:
+                self._container.mux(pkt)
+            except Exception:
+                log.exception("Failed muxing frame into %s", self._container.name)
+
+    def stop(self) -> None:
+        super().stop()
+        with self._lock:
+            container, self._container, self._stream = self._container, None, None
+        if container is not None:
+            self._close(container)
+
+    def _rotate(self, timestamp: int) -> None:
+        old = self._container
+        path = self._next_path()
+        container = None
+        try:
+            container = av.open(
+                str(path), mode="w", format="mp4", options={"movflags": "+faststart"}
+            )
+            stream = container.add_stream("h264", rate=self._fps)
+            stream.width = self._width
+            stream.height = self._height
+            stream.time_base = _TIME_BASE
+        except Exception:
+            # e.g. disk full or output_dir gone. Keep muxing into the old container (if
+            # any) and retry on the next keyframe rather than failing the encoder thread.
+            if container is not None:
+                self._close(container)
+            self._rotate_failures += 1
+            if self._rotate_failures == 1 or self._rotate_failures % 60 == 0:
+                log.exception(
+                    "Failed starting segment %s (%d attempts); retrying on the next keyframe",
+                    path.name,
+                    self._rotate_failures,
+                )
+            return
+        if self._rotate_failures:
+            log.info("Segment output recovered after %d failed attempts", self._rotate_failures)
+            self._rotate_failures = 0
+        self._container, self._stream = container, stream
+        self._segment_start_us = timestamp
+        log.info("Started segment -> %s", path.name)
+        if old is not None:
+            threading.Thread(
+                target=self._close, args=(old,), name="pyav-segment-close", daemon=False
+            ).start()
+
+    @staticmethod
+    def _close(container: Any) -> None:
+        try:
+            container.close()
+        except Exception:
+            log.exception("Failed finalizing segment %s", getattr(container, "name", "?"))
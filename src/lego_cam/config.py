@@ -1,11 +1,22 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import hashlib
+import json
+import logging
+import os
+import stat
+import tempfile
+from dataclasses import dataclass, fields
 from pathlib import Path
 from typing import Any
 
+from . import __version__
 
-@dataclass(frozen=True)
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
 class ServiceConfig:
     output_dir: Path = Path("/media/machon/PKBACK")
     min_free_mb: int = 1024
@@ -23,26 +34,30 @@ class ServiceConfig:
     led_motion_feedback: bool = True
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class CameraConfig:
     backend: str = "picamera2"  # picamera2
     width: int = 1280
     height: int = 720
     fps: int = 30
     codec: str = "h264"
-    rotation_mode: str = "ffmpeg_segment"  # ffmpeg_segment|rotate
+    rotation_mode: str = "ffmpeg_segment"  # ffmpeg_segment|pyav_segment|rotate
+    motion_stride: int = 4  # ISP downscale factor for the motion (lores) stream; 1 = full size
+    buffer_count: int = 6  # camera request buffers; raise (e.g. 10) for high resolutions/fps
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class MotionConfig:
     enable_vision_motion: bool = True
     disable_vision_if_radar_or_lidar: bool = True
     has_radar_or_lidar: bool = False
     vision_motion_fps: int = 5
     vision_motion_sensitivity: int = 25
+    # Compile the luma diff kernel with Numba (python3-numba); falls back to NumPy if missing.
+    vision_motion_jit: bool = False
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class SensorConfig:
     backend: str = "tof_i2c"  # tof_i2c
     poll_hz: int = 8
@@ -53,9 +68,10 @@ class SensorConfig:
     tof_smooth_alpha: float = 0.0  # 0=raw distance (recommended); 0.2-0.4=smoothing
     tof_hysteresis_mm: int = 80  # motion = distance change >= this (mm); increase to reduce false triggers
     tof_confirm_ms: int = 100  # require change to persist this many ms (high-freq check); 0 = no persistence
+    tof_int_gpio: int = 0  # BCM GPIO wired to the TMF8820 INT pin (0 = poll the status register)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class AppConfig:
     service: ServiceConfig = ServiceConfig()
     camera: CameraConfig = CameraConfig()
@@ -63,24 +79,154 @@ class AppConfig:
     sensor: SensorConfig = SensorConfig()
 
 
-def _deep_get(d: dict[str, Any], path: list[str], default: Any) -> Any:
-    cur: Any = d
-    for p in path:
-        if not isinstance(cur, dict) or p not in cur:
-            return default
-        cur = cur[p]
-    return cur
+# Field annotations are strings (postponed evaluation); map them to the
+# callable that coerces a raw TOML/YAML value into that type.
+_COERCERS: dict[str, Any] = {"Path": Path, "int": int, "float": float, "bool": bool, "str": str}
+
+_EMPTY: dict[str, Any] = {}
+
+
+def _section(raw: dict[str, Any], name: str) -> dict[str, Any]:
+    sec = raw.get(name)
+    return sec if isinstance(sec, dict) else _EMPTY
+
+
+_SECTION_CLASSES = (ServiceConfig, CameraConfig, MotionConfig, SensorConfig)
+
+# Sections are frozen, so a section absent from the file can share one default instance.
+_DEFAULT_SECTIONS: dict[type, Any] = {cls: cls() for cls in _SECTION_CLASSES}
+
+# Per-section (field name, coercer) pairs, resolved once instead of per load.
+_FIELD_COERCERS: dict[type, tuple[tuple[str, Any], ...]] = {
+    cls: tuple((f.name, _COERCERS[f.type]) for f in fields(cls)) for cls in _SECTION_CLASSES
+}
+
+# AppConfig's (section name, section class) pairs, e.g. ("service", ServiceConfig).
+_APP_SECTIONS: tuple[tuple[str, type], ...] = tuple(
+    (f.name, {cls.__name__: cls for cls in _SECTION_CLASSES}[f.type]) for f in fields(AppConfig)
+)
+
+
+def _build(cls: type, raw: dict[str, Any]) -> Any:
+    """Build a config section from its raw dict; absent keys keep the field default."""
+    if not raw:
+        return _DEFAULT_SECTIONS[cls]
+    return cls(**{name: coerce(raw[name]) for name, coerce in _FIELD_COERCERS[cls] if name in raw})
+
+
+# Parsed configs keyed by resolved path -> (st_mtime_ns, config).
+_config_cache: dict[str, tuple[int, AppConfig]] = {}
+
+# The cache holds the raw parsed dict, which depends only on the file bytes and the
+# parser; sections are always rebuilt through _build, so field layout and defaults
+# come from this build. Bump _CACHE_FORMAT if the cached layout changes.
+_CACHE_FORMAT = 1
 
 
 def load_config(path: str | Path) -> AppConfig:
     """
     Load config from TOML or YAML (optional dependency).
     TOML is preferred because it uses stdlib (tomllib) on Python 3.11+.
+
+    Results are memoized per file until its mtime changes, so reloading an
+    unchanged config doesn't re-read or re-parse it. The parsed TOML/YAML is also
+    cached as JSON under the user's cache dir (~/.cache/lego-cam) so a restarted
+    service can skip TOML/YAML parsing entirely while the file is unchanged.
     """
     p = Path(path)
-    if not p.exists():
-        raise FileNotFoundError(f"Config file not found: {p}")
-
+    try:
+        st = p.stat()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Config file not found: {p}") from None
+
+    key = str(p.resolve())
+    hit = _config_cache.get(key)
+    if hit is not None and hit[0] == st.st_mtime_ns:
+        return hit[1]
+
+    cache = _cache_path(key)
+    fingerprint = _fingerprint(p, st)
+    raw = _read_cached_raw(cache, fingerprint)
+    if raw is None:
+        raw = _parse_raw(p)
+        _write_cached_raw(cache, fingerprint, raw)
+    config = AppConfig(**{name: _build(cls, _section(raw, name)) for name, cls in _APP_SECTIONS})
+    _config_cache[key] = (st.st_mtime_ns, config)
+    return config
+
+
+def _cache_path(key: str) -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    name = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+    return Path(base) / "lego-cam" / f"config-{name}.json"
+
+
+def _fingerprint(p: Path, st: os.stat_result) -> list[Any]:
+    with p.open("rb") as f:
+        head = hashlib.sha256(f.read(4096)).hexdigest()
+    return [_CACHE_FORMAT, __version__, st.st_mtime_ns, st.st_size, head]
+
+
+def _is_private(st: os.stat_result) -> bool:
+    """Owned by us and not writable by group/other, so nobody else can plant content."""
+    return st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _read_cached_raw(cache: Path, fingerprint: list[Any]) -> dict[str, Any] | None:
+    try:
+        if not _is_private(os.lstat(cache.parent)):
+            log.debug("Ignoring config cache in non-private dir %s", cache.parent)
+            return None
+        fd = os.open(cache, os.O_RDONLY | os.O_NOFOLLOW)
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        log.debug("Ignoring unreadable config cache %s: %s", cache, e)
+        return None
+    try:
+        with os.fdopen(fd, "rb") as f:
+            st = os.fstat(f.fileno())
+            if not stat.S_ISREG(st.st_mode) or not _is_private(st):
+                log.debug("Ignoring config cache %s: not a private regular file", cache)
+                return None
+            cached = json.load(f)
+    except Exception as e:
+        log.debug("Ignoring unreadable config cache %s: %s", cache, e)
+        return None
+    if (
+        not isinstance(cached, dict)
+        or cached.get("fingerprint") != fingerprint
+        or not isinstance(cached.get("raw"), dict)
+    ):
+        return None
+    return cached["raw"]
+
+
+def _write_cached_raw(cache: Path, fingerprint: list[Any], raw: dict[str, Any]) -> None:
+    """Best effort: the cache dir may be unwritable, or raw may hold non-JSON values."""
+    tmp_name: str | None = None
+    try:
+        os.makedirs(cache.parent, mode=0o700, exist_ok=True)
+        if not _is_private(os.lstat(cache.parent)):
+            log.debug("Not caching parsed config in non-private dir %s", cache.parent)
+            return
+        # NamedTemporaryFile creates the file 0600.
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=cache.parent, prefix=cache.name + ".", delete=False
+        ) as f:
+            tmp_name = f.name
+            json.dump({"fingerprint": fingerprint, "raw": raw}, f)
+        os.replace(tmp_name, cache)
+    except Exception as e:
+        log.debug("Not caching parsed config in %s: %s", cache, e)
+        if tmp_name is not None:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+
+
+def _parse_raw(p: Path) -> dict[str, Any]:
     ext = p.suffix.lower()
     raw: dict[str, Any]
     if ext in (".toml",):
@@ -98,80 +244,4 @@ def load_config(path: str | Path) -> AppConfig:
         raw = yaml.safe_load(p.read_text(encoding="utf-8")) or {}
     else:
         raise ValueError(f"Unsupported config extension: {ext}")
-
-    return AppConfig(
-        service=ServiceConfig(
-            output_dir=Path(_deep_get(raw, ["service", "output_dir"], str(ServiceConfig().output_dir))),
-            min_free_mb=int(_deep_get(raw, ["service", "min_free_mb"], ServiceConfig().min_free_mb)),
-            segment_seconds=int(
-                _deep_get(raw, ["service", "segment_seconds"], ServiceConfig().segment_seconds)
-            ),
-            inactivity_seconds=int(
-                _deep_get(raw, ["service", "inactivity_seconds"], ServiceConfig().inactivity_seconds)
-            ),
-            developer_mode=bool(
-                _deep_get(raw, ["service", "developer_mode"], ServiceConfig().developer_mode)
-            ),
-            developer_view=str(
-                _deep_get(raw, ["service", "developer_view"], ServiceConfig().developer_view)
-            ),
-            developer_led_gpio=int(
-                _deep_get(raw, ["service", "developer_led_gpio"], ServiceConfig().developer_led_gpio)
-            ),
-            led_motion_feedback=bool(
-                _deep_get(raw, ["service", "led_motion_feedback"], ServiceConfig().led_motion_feedback)
-            ),
-        ),
-        camera=CameraConfig(
-            backend=str(_deep_get(raw, ["camera", "backend"], CameraConfig().backend)),
-            width=int(_deep_get(raw, ["camera", "width"], CameraConfig().width)),
-            height=int(_deep_get(raw, ["camera", "height"], CameraConfig().height)),
-            fps=int(_deep_get(raw, ["camera", "fps"], CameraConfig().fps)),
-            codec=str(_deep_get(raw, ["camera", "codec"], CameraConfig().codec)),
-            rotation_mode=str(_deep_get(raw, ["camera", "rotation_mode"], CameraConfig().rotation_mode)),
-        ),
-        motion=MotionConfig(
-            enable_vision_motion=bool(
-                _deep_get(raw, ["motion", "enable_vision_motion"], MotionConfig().enable_vision_motion)
-            ),
-            disable_vision_if_radar_or_lidar=bool(
-                _deep_get(
-                    raw,
-                    ["motion", "disable_vision_if_radar_or_lidar"],
-                    MotionConfig().disable_vision_if_radar_or_lidar,
-                )
-            ),
-            has_radar_or_lidar=bool(
-                _deep_get(raw, ["motion", "has_radar_or_lidar"], MotionConfig().has_radar_or_lidar)
-            ),
-            vision_motion_fps=int(
-                _deep_get(raw, ["motion", "vision_motion_fps"], MotionConfig().vision_motion_fps)
-            ),
-            vision_motion_sensitivity=int(
-                _deep_get(
-                    raw, ["motion", "vision_motion_sensitivity"], MotionConfig().vision_motion_sensitivity
-                )
-            ),
-        ),
-        sensor=SensorConfig(
-            backend=str(_deep_get(raw, ["sensor", "backend"], SensorConfig().backend)),
-            poll_hz=int(_deep_get(raw, ["sensor", "poll_hz"], SensorConfig().poll_hz)),
-            simulate=bool(_deep_get(raw, ["sensor", "simulate"], SensorConfig().simulate)),
-            tof_min_confidence=int(
-                _deep_get(raw, ["sensor", "tof_min_confidence"], SensorConfig().tof_min_confidence)
-            ),
-            tof_calibration_file=str(
-                _deep_get(raw, ["sensor", "tof_calibration_file"], SensorConfig().tof_calibration_file)
-            ),
-            tof_smooth_alpha=float(
-                _deep_get(raw, ["sensor", "tof_smooth_alpha"], SensorConfig().tof_smooth_alpha)
-            ),
-            tof_hysteresis_mm=int(
-                _deep_get(raw, ["sensor", "tof_hysteresis_mm"], SensorConfig().tof_hysteresis_mm)
-            ),
-            tof_confirm_ms=int(
-                _deep_get(raw, ["sensor", "tof_confirm_ms"], SensorConfig().tof_confirm_ms)
-            ),
-        ),
-    )
-
+    return raw
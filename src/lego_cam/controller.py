@@ -3,39 +3,47 @@ from __future__ import annotations
 import asyncio
 import logging
 import os
-import shutil
-import subprocess
-from dataclasses import dataclass
+import re
 from enum import Enum
 from pathlib import Path
-from time import monotonic
-
-try:
-    from src.lego_cam.config import AppConfig  # type: ignore
-    from src.lego_cam.led import run_developer_led_sequence  # type: ignore
-    from src.lego_cam.motion.vision_motion import VisionMotionDetector  # type: ignore
-    from src.lego_cam.sensors.tof_i2c import ToFSensor, check_tof_health  # type: ignore
-    from src.lego_cam.storage import StorageManager  # type: ignore
-except ImportError:
-    from lego_cam.config import AppConfig
-    from lego_cam.led import run_developer_led_sequence
-    from lego_cam.motion.vision_motion import VisionMotionDetector
-    from lego_cam.sensors.tof_i2c import ToFSensor, check_tof_health
-    from lego_cam.storage import StorageManager
+from time import monotonic_ns
+from typing import NamedTuple
+
+# Relative imports resolve against whichever name the package was loaded under
+# (src.lego_cam from a checkout, lego_cam when installed) without a failed probe.
+from .config import AppConfig
+from .led import run_developer_led_sequence
+from .motion.vision_motion import VisionMotionDetector
+from .sensors.tof_i2c import ToFSensor, check_tof_health
+from .storage import StorageManager
 
 
 log = logging.getLogger(__name__)
 
+# `vcgencmd measure_volts core` output, e.g. "volt=0.8625V".
+_VOLT_RE = re.compile(r"volt=([0-9.]+)V")
+
+# Motion events closer together than this are ignored.
+_DEBOUNCE_NS = 500_000_000
+# Minimum spacing between storage prune passes on recording start/stop, applied only
+# while the last pass left at least _PRUNE_HEADROOM x min_free_mb free.
+_PRUNE_COOLDOWN_NS = 30 * 1_000_000_000
+_PRUNE_HEADROOM = 1.5
+
+
+def _fmt(value: float | None, spec: str) -> str:
+    """Format an optional reading for the status log; None -> "n/a"."""
+    return "n/a" if value is None else format(value, spec)
+
 
 class State(str, Enum):
     IDLE = "idle"
     RECORDING = "recording"
 
 
-@dataclass(frozen=True)
-class MotionEvent:
+class MotionEvent(NamedTuple):
     source: str  # sensor|camera
-    t_monotonic: float
+    t_ns: int  # time.monotonic_ns()
     score: float = 1.0
 
 
@@ -61,6 +69,7 @@ class RecordingController:
             smooth_alpha=config.sensor.tof_smooth_alpha,
             hysteresis_mm=float(config.sensor.tof_hysteresis_mm),
             confirm_ms=float(config.sensor.tof_confirm_ms),
+            int_gpio=config.sensor.tof_int_gpio,
         )
         self._recorder = self._build_recorder()
 
@@ -76,10 +85,19 @@ class RecordingController:
             enabled=vision_enabled,
             sample_fps=config.motion.vision_motion_fps,
             sensitivity=config.motion.vision_motion_sensitivity,
+            # The lores stream is already scaled down by camera.motion_stride; keep ~16x overall.
+            downsample=max(1, 16 // max(1, config.camera.motion_stride)),
+            use_jit=config.motion.vision_motion_jit,
         )
 
-        self._last_motion_t: float | None = None
+        self._last_motion_t_ns: int | None = None
         self._last_motion_event: MotionEvent | None = None
+        self._last_prune_ns: int | None = None
+        self._last_free_mb = 0
+        # Set while RECORDING; lets the state/camera loops sleep instead of polling when IDLE.
+        self._recording_evt = asyncio.Event()
+        # Set whenever the inactivity timer is extended; wakes _state_loop early.
+        self._motion_evt = asyncio.Event()
         self._led = None  # status LED for motion feedback (on=recording, off=idle)
 
     def _validate_environment(self) -> None:
@@ -89,9 +107,11 @@ class RecordingController:
                 "Set camera.backend = \"picamera2\" in config."
             )
 
-        try:
-            import picamera2  # type: ignore  # noqa: F401
-        except Exception as e:
+        # Probe with find_spec rather than importing: the recorder imports picamera2
+        # (and numpy/av) itself when it starts, so construction stays cheap.
+        from importlib.util import find_spec
+
+        if find_spec("picamera2") is None:
             import sys
             raise RuntimeError(
                 "Picamera2 is required but not found in this Python.\n"
@@ -104,20 +124,27 @@ class RecordingController:
                 "Do NOT use the .venv interpreter unless you created it with:\n"
                 "  python3 -m venv .venv --system-site-packages"
                 % (getattr(sys, "executable", "unknown"))
-            ) from e
+            )
 
         if self._config.camera.rotation_mode == "ffmpeg_segment":
+            import shutil
+
             if shutil.which("ffmpeg") is None:
                 raise RuntimeError(
                     "ffmpeg not found. Install with:\n"
                     "  sudo apt install -y ffmpeg\n"
                     "Or set camera.rotation_mode = \"rotate\" in config."
                 )
+        elif self._config.camera.rotation_mode == "pyav_segment":
+            if find_spec("av") is None:
+                raise RuntimeError(
+                    "PyAV not found. Install with:\n"
+                    "  sudo apt install -y python3-av\n"
+                    "Or set camera.rotation_mode = \"ffmpeg_segment\" in config."
+                )
 
         if self._config.motion.enable_vision_motion:
-            try:
-                import numpy  # type: ignore  # noqa: F401
-            except Exception:
+            if find_spec("numpy") is None:
                 log.warning(
                     "numpy not available; vision motion will be disabled automatically."
                 )
@@ -163,15 +190,13 @@ class RecordingController:
                 t2.add_done_callback(lambda t: _log_task_result(t, "camera_motion_loop"))
                 t3 = tg.create_task(self._state_loop())
                 t3.add_done_callback(lambda t: _log_task_result(t, "state_loop"))
-                t_dist = tg.create_task(self._distance_log_loop())
-                t_dist.add_done_callback(lambda t: _log_task_result(t, "distance_log_loop"))
-                if self._developer_mode:
-                    t4 = tg.create_task(self._dev_status_loop())
-                    t4.add_done_callback(lambda t: _log_task_result(t, "dev_status_loop"))
+                t4 = tg.create_task(self._status_loop())
+                t4.add_done_callback(lambda t: _log_task_result(t, "status_loop"))
         finally:
             if self._led is not None:
+                # The LED is shared per pin and closed at exit; just leave it dark.
                 try:
-                    self._led.close()
+                    self._led.off()
                 except Exception:
                     pass
                 self._led = None
@@ -180,10 +205,7 @@ class RecordingController:
         if self._config.camera.backend != "picamera2":
             raise ValueError(f"Unsupported camera backend: {self._config.camera.backend}")
 
-        try:
-            from src.lego_cam.camera.picamera2_recorder import Picamera2Recorder  # type: ignore
-        except ImportError:
-            from lego_cam.camera.picamera2_recorder import Picamera2Recorder
+        from .camera.picamera2_recorder import Picamera2Recorder
 
         return Picamera2Recorder(
             output_dir=self._config.service.output_dir,
@@ -193,6 +215,9 @@ class RecordingController:
             rotation_mode=self._config.camera.rotation_mode,
             segment_seconds=self._config.service.segment_seconds,
             developer_mode=self._developer_mode,
+            motion_stride=self._config.camera.motion_stride,
+            motion_fps=self._config.motion.vision_motion_fps,
+            buffer_count=self._config.camera.buffer_count,
         )
 
     async def _sensor_loop(self) -> None:
@@ -206,61 +231,72 @@ class RecordingController:
             if ev:
                 log.info("Sensor motion: trigger (distance change >= hysteresis)")
                 await self._on_motion(
-                    MotionEvent(source="sensor", t_monotonic=monotonic(), score=1.0)
+                    MotionEvent(source="sensor", t_ns=monotonic_ns(), score=1.0)
                 )
 
     async def _camera_motion_loop(self) -> None:
         """
         Vision-based motion is only used while recording (and can be disabled by config).
         """
+        # Bound once; this loop ticks at 10 Hz for as long as a recording runs.
+        recording = self._recording_evt
+        vision = self._vision
+        get_frame = self._recorder.get_motion_frame
+        on_motion = self._on_motion
         while True:
+            if not recording.is_set():
+                await recording.wait()
             await asyncio.sleep(0.1)
-            if self._state != State.RECORDING:
+            if not recording.is_set():
                 continue
-            if not self._vision.enabled:
+            if not vision.enabled:
                 continue
-            frame = await self._recorder.get_motion_frame()
+            frame = await get_frame()
             if frame is None:
                 continue
-            if self._vision.detect(frame):
-                await self._on_motion(MotionEvent(source="camera", t_monotonic=monotonic(), score=1.0))
-
-    async def _distance_log_loop(self) -> None:
-        """Log ToF distance to journal every 2s so journalctl always shows it."""
-        while True:
-            await asyncio.sleep(2.0)
-            d = getattr(self._sensor, "debug_distance_mm", None)
-            if d is not None:
-                log.info("ToF distance_mm=%.1f", d)
-            else:
-                log.info("ToF distance_mm=n/a")
+            if vision.detect(frame):
+                await on_motion(MotionEvent(source="camera", t_ns=monotonic_ns(), score=1.0))
 
     async def _state_loop(self) -> None:
+        """
+        Stop recording after inactivity_seconds without (camera) motion.
+
+        Sleeps until the inactivity deadline instead of ticking; a timer extension in
+        _on_motion wakes it early to recompute the deadline.
+        """
         inactivity = self._config.service.inactivity_seconds
+        inactivity_ns = inactivity * 1_000_000_000
         while True:
-            await asyncio.sleep(0.2)
-            if self._state == State.IDLE:
+            if self._state is State.IDLE:
+                await self._recording_evt.wait()
                 continue
 
             # RECORDING
-            if self._last_motion_t is None:
+            if self._last_motion_t_ns is None:
+                await asyncio.sleep(0.2)
                 continue
-            if monotonic() - self._last_motion_t >= inactivity:
+            self._motion_evt.clear()
+            remaining = (self._last_motion_t_ns + inactivity_ns - monotonic_ns()) / 1e9
+            if remaining <= 0:
                 log.info("No motion for %ss -> stopping recording", inactivity)
                 await self._stop_recording()
+                continue
+            try:
+                await asyncio.wait_for(self._motion_evt.wait(), timeout=remaining)
+            except TimeoutError:
+                pass
 
     async def _on_motion(self, ev: MotionEvent) -> None:
         # Debouncing: ignore motion events that are too close together (< 0.5s)
-        if self._last_motion_t is not None:
-            time_since_last = ev.t_monotonic - self._last_motion_t
-            if time_since_last < 0.5:
+        if self._last_motion_t_ns is not None:
+            if ev.t_ns - self._last_motion_t_ns < _DEBOUNCE_NS:
                 return  # Ignore rapid-fire events
 
         self._last_motion_event = ev
 
-        if self._state == State.IDLE:
+        if self._state is State.IDLE:
             # Any source (sensor or camera) can start recording from IDLE.
-            self._last_motion_t = ev.t_monotonic
+            self._last_motion_t_ns = ev.t_ns
             log.info("Motion detected (%s) -> starting recording", ev.source)
             await self._start_recording()
             return
@@ -268,7 +304,8 @@ class RecordingController:
         # RECORDING:
         # Only camera motion is allowed to extend the inactivity timer.
         if ev.source == "camera":
-            self._last_motion_t = ev.t_monotonic
+            self._last_motion_t_ns = ev.t_ns
+            self._motion_evt.set()
             log.debug("Motion detected (%s) -> reset inactivity timer", ev.source)
         else:
             log.debug(
@@ -276,38 +313,59 @@ class RecordingController:
                 ev.source,
             )
 
-    async def _dev_status_loop(self) -> None:
+    async def _status_loop(self) -> None:
         """
-        Periodically log rich status information for developer mode:
+        Log ToF distance to journal every 2s so journalctl always shows it.
+
+        In developer mode the loop ticks every 1s and also logs rich status:
         - distance from sensor (if available)
         - camera/recorder state
         - time since last motion & source
         - basic CPU temperature / load / voltage
         """
+        period = 1.0 if self._developer_mode else 2.0
+        distance_every = max(1, round(2.0 / period))
+
+        temp_path: Path | None = None
+        vcgencmd: str | None = None
+        if self._developer_mode:
+            import shutil
+            import subprocess
+
+            # Probe once: these never appear or vanish while we run.
+            temp_path = Path("/sys/class/thermal/thermal_zone0/temp")
+            if not temp_path.exists():
+                temp_path = None
+            vcgencmd = shutil.which("vcgencmd")
+
+        # Temperature and voltage change slowly; refresh them every N ticks.
+        slow_every = 5
+        cpu_temp_c: float | None = None
+        voltage_v: float | None = None
+
+        tick = 0
         while True:
-            await asyncio.sleep(1.0)
+            await asyncio.sleep(period)
+            tick += 1
+
+            # Nothing below is kept except for the log line; skip it all when INFO is filtered.
+            if not log.isEnabledFor(logging.INFO):
+                continue
+
+            # Sensor distance (None until the backend has a reading)
+            distance_mm = self._sensor.debug_distance_mm
+            if tick % distance_every == 0:
+                log.info("ToF distance_mm=%s", _fmt(distance_mm, ".1f"))
+            if not self._developer_mode:
+                continue
 
             # Time since last motion
-            now = monotonic()
             last_motion_age = None
-            if self._last_motion_t is not None:
-                last_motion_age = now - self._last_motion_t
+            if self._last_motion_t_ns is not None:
+                last_motion_age = (monotonic_ns() - self._last_motion_t_ns) / 1e9
 
             last_source = self._last_motion_event.source if self._last_motion_event else None
 
-            # Sensor distance (if backend exposes it)
-            distance_mm = getattr(self._sensor, "debug_distance_mm", None)
-
-            # CPU temperature (Raspberry Pi typical path)
-            cpu_temp_c: float | None = None
-            temp_path = Path("/sys/class/thermal/thermal_zone0/temp")
-            try:
-                if temp_path.exists():
-                    raw = temp_path.read_text().strip()
-                    cpu_temp_c = float(raw) / 1000.0
-            except Exception:
-                cpu_temp_c = None
-
             # CPU load (1‑minute average)
             cpu_load_1: float | None = None
             try:
@@ -315,44 +373,67 @@ class RecordingController:
             except (AttributeError, OSError):
                 cpu_load_1 = None
 
+            refresh_slow = tick % slow_every == 1
+
+            # CPU temperature (Raspberry Pi typical path)
+            if refresh_slow and temp_path is not None:
+                try:
+                    raw = temp_path.read_text().strip()
+                    cpu_temp_c = float(raw) / 1000.0
+                except Exception:
+                    cpu_temp_c = None
+
             # Core voltage (if vcgencmd is available)
-            voltage_v: float | None = None
-            try:
-                proc = subprocess.run(
-                    ["vcgencmd", "measure_volts", "core"],
-                    capture_output=True,
-                    text=True,
-                    timeout=0.5,
-                    check=False,
-                )
-                out = proc.stdout.strip()
-                # Example: "volt=0.8625V"
-                if "volt=" in out and out.endswith("V"):
-                    voltage_v = float(out.split("volt=")[1].rstrip("V"))
-            except Exception:
-                voltage_v = None
+            if refresh_slow and vcgencmd is not None:
+                try:
+                    proc = subprocess.run(
+                        [vcgencmd, "measure_volts", "core"],
+                        capture_output=True,
+                        text=True,
+                        timeout=0.5,
+                        check=False,
+                    )
+                    m = _VOLT_RE.search(proc.stdout)
+                    voltage_v = float(m.group(1)) if m else None
+                except Exception:
+                    voltage_v = None
 
             log.info(
                 "DEV status | state=%s distance_mm=%s last_motion_age=%.2fs last_source=%s "
                 "cpu_temp_c=%s cpu_load_1=%.2f voltage_v=%s",
                 self._state.value,
-                f"{distance_mm:.1f}" if isinstance(distance_mm, (int, float)) else "n/a",
+                _fmt(distance_mm, ".1f"),
                 last_motion_age if last_motion_age is not None else -1.0,
                 last_source or "n/a",
-                f"{cpu_temp_c:.1f}" if isinstance(cpu_temp_c, (int, float)) else "n/a",
+                _fmt(cpu_temp_c, ".1f"),
                 cpu_load_1 if cpu_load_1 is not None else -1.0,
-                f"{voltage_v:.3f}" if isinstance(voltage_v, (int, float)) else "n/a",
+                _fmt(voltage_v, ".3f"),
             )
 
+    def _prune_storage(self) -> None:
+        # Recordings flapping around the inactivity window would otherwise re-check
+        # (and possibly re-scan) the output dir on every start and stop.
+        # Near the threshold, check every time.
+        now = monotonic_ns()
+        if (
+            self._last_prune_ns is not None
+            and now - self._last_prune_ns < _PRUNE_COOLDOWN_NS
+            and self._last_free_mb >= self._storage.min_free_mb * _PRUNE_HEADROOM
+        ):
+            return
+        self._last_free_mb = self._storage.ensure_free_space()
+        self._last_prune_ns = now
+
     async def _start_recording(self) -> None:
-        self._storage.ensure_free_space()
+        self._prune_storage()
         try:
             await self._recorder.start()
         except Exception:
             log.exception("Failed to start recorder")
             raise
         self._state = State.RECORDING
-        self._last_motion_t = monotonic()
+        self._last_motion_t_ns = monotonic_ns()
+        self._recording_evt.set()
         if self._led is not None and self._config.service.led_motion_feedback:
             try:
                 self._led.on()
@@ -365,9 +446,10 @@ class RecordingController:
             await self._recorder.stop()
         except Exception:
             log.exception("Error stopping recorder")
-        self._storage.ensure_free_space()
+        self._prune_storage()
         self._state = State.IDLE
-        self._last_motion_t = None
+        self._last_motion_t_ns = None
+        self._recording_evt.clear()
         if self._led is not None and self._config.service.led_motion_feedback:
             try:
                 self._led.off()
@@ -8,53 +8,108 @@ Startup blink + ToF health, then on=recording/motion, off=idle. Does NOT touch t
 from __future__ import annotations
 
 import asyncio
+import atexit
 import logging
+import time
+from typing import Any
 
 log = logging.getLogger(__name__)
 
+# Open gpiozero LEDs by BCM pin. Opening one sets up the pin factory and claims the
+# line, so a pin is opened once per process and closed at interpreter exit.
+_LED_CACHE: dict[int, Any] = {}
+
+
+def _get_led(led_cls: Any, gpio_pin: int) -> Any:
+    led = _LED_CACHE.get(gpio_pin)
+    if led is None:
+        led = _LED_CACHE[gpio_pin] = led_cls(gpio_pin)
+        atexit.register(_release_led, gpio_pin)
+    return led
+
+
+def _release_led(gpio_pin: int) -> None:
+    led = _LED_CACHE.pop(gpio_pin, None)
+    if led is not None:
+        try:
+            led.close()
+        except Exception:
+            pass
+
+
+# A blink pattern is a sequence of (turn_on, at_seconds) steps, with times measured
+# from the start of the pattern; the last step marks where the pattern ends.
+_Schedule = tuple[tuple[bool, float], ...]
+
+
+def _blink_schedule(
+    on: float, off: float, count: int, pause: float = 0.0, bursts: int = 1
+) -> _Schedule:
+    """Build `bursts` groups of `count` on/off blinks, separated (and followed) by `pause`."""
+    ops: list[tuple[bool, float]] = []
+    t = 0.0
+    for _ in range(bursts):
+        for _ in range(count):
+            ops.append((True, t))
+            t += on
+            ops.append((False, t))
+            t += off
+        t += pause
+    ops.append((False, t))
+    return tuple(ops)
+
+
+def _play_schedule(led: object, ops: _Schedule) -> None:
+    """Play a blink schedule against absolute deadlines (blocking; run on a worker thread)."""
+    # Resolve the pin writers once; indexing by the step's bool replaces the per-edge branch.
+    write = (led.off, led.on)
+    sleep, now = time.sleep, time.monotonic
+    base = now()
+    for turn_on, at in ops:
+        delay = base + at - now()
+        if delay > 0:
+            sleep(delay)
+        write[turn_on]()
+
+
+async def _blink(
+    led: object, on: float, off: float, count: int, pause: float = 0.0, bursts: int = 1
+) -> None:
+    """
+    Blink `bursts` groups of `count` on/off cycles, separated (and followed) by `pause`.
+
+    A single burst is handed to gpiozero's LED.blink(n=..., background=True), which
+    toggles the pin from its own thread. Multi-burst patterns (and LED-like objects
+    without blink()) are played as one precomputed schedule on a worker thread, so
+    the event loop wakes once per pattern and event-loop jitter never reaches the
+    edges.
+    """
+    blink = getattr(led, "blink", None)
+    if blink is None or bursts > 1:
+        await asyncio.to_thread(_play_schedule, led, _blink_schedule(on, off, count, pause, bursts))
+        return
+    blink(on_time=on, off_time=off, n=count, background=True)
+    await asyncio.sleep(count * (on + off) + pause)
+
 
 async def _led_blink_startup(led: object, duration_sec: float = 5.0) -> None:
     """Blink on/off for duration_sec (0.5s on, 0.5s off)."""
-    half = 0.5
-    cycles = int(duration_sec / (2 * half))
-    for _ in range(cycles):
-        led.on()
-        await asyncio.sleep(half)
-        led.off()
-        await asyncio.sleep(half)
+    await _blink(led, 0.5, 0.5, round(duration_sec))
 
 
 async def _led_blink_tof_fail(led: object) -> None:
     """5 bursts of 3 blinks, ~3 seconds total."""
-    blink_on, blink_off = 0.12, 0.08
-    burst_pause = 0.25
-    for _ in range(5):
-        for _ in range(3):
-            led.on()
-            await asyncio.sleep(blink_on)
-            led.off()
-            await asyncio.sleep(blink_off)
-        await asyncio.sleep(burst_pause)
+    await _blink(led, 0.12, 0.08, 3, pause=0.25, bursts=5)
 
 
 async def led_3_blinks(led: object) -> None:
     """Three short blinks (e.g. 'ready to run' signal)."""
-    for _ in range(3):
-        led.on()
-        await asyncio.sleep(0.2)
-        led.off()
-        await asyncio.sleep(0.2)
+    await _blink(led, 0.2, 0.2, 3)
 
 
 async def _led_blink_ok(led: object, duration_sec: float = 3.0) -> None:
     """Slow blink on/off for duration_sec (0.5s on, 0.5s off)."""
-    half = 0.5
-    cycles = int(duration_sec / (2 * half))
-    for _ in range(cycles):
-        led.on()
-        await asyncio.sleep(half)
-        led.off()
-        await asyncio.sleep(half)
+    await _blink(led, 0.5, 0.5, round(duration_sec))
 
 
 async def run_developer_led_sequence(
@@ -66,7 +121,8 @@ async def run_developer_led_sequence(
     Grabs GPIO first (before ToF) to avoid "gpio busy". Runs tof_check_coro
     after startup blink to get ToF status for the result blink.
 
-    Returns the LED object for motion feedback (caller must close when done).
+    Returns the LED object for motion feedback. It is shared per pin for the life of
+    the process (closed at exit); callers should turn it off, not close it.
     Returns None if LED failed or gpio_pin <= 0.
 
     Sequence:
@@ -88,7 +144,7 @@ async def run_developer_led_sequence(
     for attempt in range(1, 4):
         try:
             await asyncio.sleep(2.0 if attempt > 1 else 0.3)
-            led = LED(gpio_pin)
+            led = _get_led(LED, gpio_pin)
             led.off()
             break
         except Exception as e:
@@ -116,8 +172,5 @@ async def run_developer_led_sequence(
         return led
     except Exception as e:
         log.warning("Developer LED failed during sequence: %s", e)
-        try:
-            led.close()
-        except Exception:
-            pass
+        _release_led(gpio_pin)
         return None
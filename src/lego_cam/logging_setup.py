@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import logging
+import os
 import sys
 
 
@@ -15,11 +16,20 @@ def setup_logging(level: str = "INFO") -> None:
     lvl = getattr(logging, level.upper(), logging.INFO)
     root.setLevel(lvl)
 
+    # No format string uses pid/thread/process names; skip collecting them per record.
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    # systemd sets JOURNAL_STREAM when stdout goes to journald, which timestamps every
+    # line itself; skip the per-record strftime there and keep it for terminals/Thonny.
+    if os.environ.get("JOURNAL_STREAM"):
+        fmt = "%(levelname)s %(name)s: %(message)s"
+    else:
+        fmt = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
     handler = logging.StreamHandler(sys.stdout)
-    formatter = logging.Formatter(
-        fmt="%(asctime)s %(levelname)s %(name)s: %(message)s",
-        datefmt="%Y-%m-%dT%H:%M:%S",
-    )
+    formatter = logging.Formatter(fmt=fmt, datefmt="%Y-%m-%dT%H:%M:%S")
     handler.setFormatter(formatter)
     root.addHandler(handler)
 
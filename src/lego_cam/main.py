@@ -6,20 +6,13 @@ import logging
 import signal
 from pathlib import Path
 
-try:
-    # When running from source via `python -m src.lego_cam.main`
-    from src.lego_cam.config import AppConfig, load_config  # type: ignore
-    from src.lego_cam.controller import RecordingController  # type: ignore
-    from src.lego_cam.logging_setup import setup_logging  # type: ignore
-    from src.lego_cam.storage import StorageManager  # type: ignore
-    from src.lego_cam.sensor_test import run_sensor_test  # type: ignore
-except ImportError:
-    # When installed as a package (console script: lego_cam.main:main)
-    from lego_cam.config import AppConfig, load_config
-    from lego_cam.controller import RecordingController
-    from lego_cam.logging_setup import setup_logging
-    from lego_cam.storage import StorageManager
-    from lego_cam.sensor_test import run_sensor_test
+# Relative imports work both from source (`python -m src.lego_cam.main`) and
+# installed (console script: lego_cam.main:main).
+from .config import AppConfig, load_config
+from .controller import RecordingController
+from .logging_setup import setup_logging
+from .storage import StorageManager
+from .sensor_test import run_sensor_test
 
 
 log = logging.getLogger(__name__)
@@ -65,12 +58,17 @@ def main() -> None:
         log.info("Shutdown requested")
         stop_event.set()
 
+    def _signal_handler(*_: object) -> None:
+        # Plain signal handlers run outside the loop's control; hand the stop
+        # request to the loop instead of touching the Event from here.
+        loop.call_soon_threadsafe(_request_stop)
+
     for sig in (signal.SIGINT, signal.SIGTERM):
         try:
             loop.add_signal_handler(sig, _request_stop)
         except NotImplementedError:
             # On some platforms (e.g. Windows), signal handlers differ.
-            signal.signal(sig, lambda *_: _request_stop())
+            signal.signal(sig, _signal_handler)
 
     async def _main_task() -> None:
         runner = asyncio.create_task(_run(config))
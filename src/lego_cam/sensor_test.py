@@ -2,29 +2,36 @@ from __future__ import annotations
 
 import asyncio
 import logging
+from statistics import fmean, median
 
-try:
-    from src.lego_cam.config import AppConfig  # type: ignore
-except ImportError:
-    from lego_cam.config import AppConfig
+from .config import AppConfig
 
 log = logging.getLogger(__name__)
 
+# Log the INFO summary line for every Nth sample.
+_SUMMARY_EVERY = 10
 
-def _median(values: list[float]) -> float:
-    values = sorted(values)
-    mid = len(values) // 2
-    if len(values) % 2:
-        return values[mid]
-    return (values[mid - 1] + values[mid]) / 2.0
+
+async def _sleep_until(deadline: float, spin: float = 0.001) -> None:
+    """
+    Sleep until loop.time() reaches deadline: a timer sleep up to `spin` seconds
+    before it, then zero-delay yields for the rest, so loop timer slack doesn't
+    land on the sample. Other tasks still run during the spin.
+    """
+    loop = asyncio.get_running_loop()
+    coarse = deadline - spin - loop.time()
+    if coarse > 0:
+        await asyncio.sleep(coarse)
+    while loop.time() < deadline:
+        await asyncio.sleep(0)
 
 
 async def run_sensor_test(config: AppConfig) -> None:
     """
     Developer-only sensor diagnostics:
     - No camera init
-    - Prints raw TMF8820 zone results (distance + confidence)
-    - Prints summary stats each sample
+    - Logs raw TMF8820 zone results (distance + confidence) at DEBUG only
+    - Logs summary stats at INFO every _SUMMARY_EVERY samples
     """
     poll_hz = max(1, int(config.sensor.poll_hz))
     period = 1.0 / float(poll_hz)
@@ -34,7 +41,10 @@ async def run_sensor_test(config: AppConfig) -> None:
 
     try:
         from smbus2 import SMBus  # type: ignore
-        from tmf882x import TMF882x, TMF882xException  # type: ignore
+        from tmf882x import TMF882xException  # type: ignore
+
+        # Single-transaction result reads (see sensors/tmf882x_fast).
+        from .sensors.tmf882x_fast import FastTMF882x as TMF882x
     except Exception as e:
         raise RuntimeError(
             "tmf882x-driver is required for sensor_test. Install with:\n"
@@ -61,9 +71,21 @@ async def run_sensor_test(config: AppConfig) -> None:
         except Exception as e:
             log.warning("SENSOR_TEST: calibration check/calibrate failed: %s", e)
 
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        # Level is fixed for the session; checked once instead of per sample.
+        debug = log.isEnabledFor(logging.DEBUG)
         n = 0
         while True:
-            await asyncio.sleep(period)
+            # Fixed-rate schedule: a slow measure shortens the next wait instead of
+            # pushing every later sample back. When already late, sleep(0) just yields
+            # to the loop (no timer-heap entry) and the schedule restarts from now.
+            next_tick += period
+            if next_tick > loop.time():
+                await _sleep_until(next_tick)
+            else:
+                await asyncio.sleep(0)
+                next_tick = loop.time()
             n += 1
             try:
                 m = tof.measure()
@@ -74,12 +96,17 @@ async def run_sensor_test(config: AppConfig) -> None:
                 log.error("SENSOR_TEST: I2C OS error: %s", e)
                 continue
 
-            # Raw per-zone values
-            raw = [(r.distance, r.confidence) for r in m.results]
-            log.info("SENSOR_TEST #%s: raw zones (distance_mm, confidence)=%s", n, raw)
+            # Raw per-zone values (DEBUG only)
+            if debug:
+                raw = [(r.distance, r.confidence) for r in m.results]
+                log.debug("SENSOR_TEST #%s: raw zones (distance_mm, confidence)=%s", n, raw)
 
-            dists = [float(d) for (d, c) in raw if d > 0]
-            confs = [int(c) for (d, c) in raw if d > 0]
+            # Summary on every _SUMMARY_EVERY-th sample only (journald bandwidth).
+            if n % _SUMMARY_EVERY:
+                continue
+            zones = [r for r in m.results if r.distance > 0]
+            dists = [float(r.distance) for r in zones]
+            confs = [int(r.confidence) for r in zones]
             if not dists:
                 log.info("SENSOR_TEST #%s: no distances > 0", n)
                 continue
@@ -89,9 +116,9 @@ async def run_sensor_test(config: AppConfig) -> None:
                 "avg_conf=%.1f zones_with_d=%s n_valid_results=%s",
                 n,
                 min(dists),
-                _median(dists),
+                median(dists),
                 max(dists),
-                (sum(confs) / len(confs)) if confs else 0.0,
+                fmean(confs) if confs else 0.0,
                 len(dists),
                 getattr(m, "n_valid_results", "n/a"),
             )
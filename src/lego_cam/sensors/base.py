@@ -9,6 +9,9 @@ class BaseSensor(ABC):
     Base interface for sensors producing motion/presence events.
     """
 
+    # Most recent distance estimate in mm, for status logging; None if unknown/unsupported.
+    debug_distance_mm: float | None = None
+
     @abstractmethod
     async def events(self) -> AsyncIterator[bool]:
         """
@@ -0,0 +1,116 @@
+"""
+Faster measure() for the tmf882x-driver TMF882x class.
+
+The stock driver reads the 132-byte result frame as five SMBus block reads
+(SMBus caps a block at 32 bytes) and re-reads the SPAD map through the
+configuration page (LOAD_CONFIG_PAGE / read / WRITE_CONFIG_PAGE) on every
+measurement. FastTMF882x reads the whole frame in one repeated-start I2C
+transaction via i2c_rdwr and caches the SPAD map until the device is re-enabled.
+
+measure_frame() returns the raw result page; closest_zone() reduces it straight
+from the bytes, skipping the 18 per-zone result objects measure() builds.
+
+start_continuous() / read_frame() / stop_continuous() run the sensor in continuous
+mode with the result interrupt routed to its INT pin, so a caller can wait on a
+GPIO edge instead of polling the status register.
+"""
+
+from __future__ import annotations
+
+from time import sleep
+
+from smbus2 import i2c_msg  # type: ignore
+from tmf882x import TMF882x  # type: ignore
+from tmf882x.measurement import TMF882xMeasurement  # type: ignore
+
+
+# Result page: header (0x20-0x37) followed by 36 x (confidence, distance LSB, MSB).
+_RESULTS_REGISTER = 0x20
+_RESULTS_SIZE = 132
+# Primary results: the first 18 records, starting after the 24-byte header.
+_PRIMARY_START = 24
+_PRIMARY_END = _PRIMARY_START + 18 * 3
+_INT_STATUS = 0xE1  # write 1 to clear
+_INT_ENAB = 0xE2
+_INT_RESULT = 0b10  # measurement result ready
+
+
+def closest_zone(frame: bytes) -> tuple[int, int]:
+    """
+    (closest primary distance > 0 in mm, number of zones with distance > 0) for a
+    raw result page; (0, 0) when no zone has a distance.
+    """
+    closest = 0
+    zones = 0
+    for i in range(_PRIMARY_START + 1, _PRIMARY_END, 3):
+        d = frame[i] | frame[i + 1] << 8
+        if d:
+            zones += 1
+            if closest == 0 or d < closest:
+                closest = d
+    return closest, zones
+
+
+class FastTMF882x(TMF882x):
+    _spad_map_cache: int | None = None
+
+    def enable(self, auto_load_firmware: bool = True) -> None:
+        # A (re-)enable may reload firmware and reset the configuration page.
+        self._spad_map_cache = None
+        super().enable(auto_load_firmware)
+
+    @property
+    def spad_map(self) -> int:
+        if self._spad_map_cache is None:
+            self._spad_map_cache = TMF882x.spad_map.fget(self)
+        return self._spad_map_cache
+
+    @spad_map.setter
+    def spad_map(self, map_id: int) -> None:
+        TMF882x.spad_map.fset(self, map_id)
+        self._spad_map_cache = map_id
+
+    def measure(self) -> TMF882xMeasurement:
+        return TMF882xMeasurement.from_bytes(self.measure_frame(), spad_map=self.spad_map)
+
+    def measure_frame(self) -> bytes:
+        """Run one measurement and return the raw 132-byte result page."""
+        bus, address = self.bus, self.address
+        # Clear interrupts
+        bus.write_byte_data(address, _INT_STATUS, 0xFF)
+        # MEASURE
+        self._send_command(0x10)
+        while not (bus.read_byte_data(address, _INT_STATUS) & _INT_RESULT):
+            sleep(self.poll_delay)
+        # Whole result frame in one write-then-read transaction (register auto-increments).
+        write = i2c_msg.write(address, [_RESULTS_REGISTER])
+        read = i2c_msg.read(address, _RESULTS_SIZE)
+        bus.i2c_rdwr(write, read)
+        # STOP
+        bus.write_byte_data(address, 0x08, 0xFF)
+        return bytes(read)
+
+    def start_continuous(self, period_ms: int) -> None:
+        """Measure every period_ms, pulling INT (active low) when each result is ready."""
+        self.measurement_period = period_ms
+        bus, address = self.bus, self.address
+        bus.write_byte_data(address, _INT_STATUS, 0xFF)
+        bus.write_byte_data(address, _INT_ENAB, _INT_RESULT)
+        # MEASURE; keeps running until STOP.
+        self._send_command(0x10)
+
+    def read_frame(self) -> bytes:
+        """Read the latest result page in continuous mode and release INT."""
+        bus, address = self.bus, self.address
+        write = i2c_msg.write(address, [_RESULTS_REGISTER])
+        read = i2c_msg.read(address, _RESULTS_SIZE)
+        bus.i2c_rdwr(write, read)
+        bus.write_byte_data(address, _INT_STATUS, _INT_RESULT)
+        return bytes(read)
+
+    def stop_continuous(self) -> None:
+        bus, address = self.bus, self.address
+        # STOP
+        bus.write_byte_data(address, 0x08, 0xFF)
+        bus.write_byte_data(address, _INT_ENAB, 0)
+        bus.write_byte_data(address, _INT_STATUS, 0xFF)
@@ -4,19 +4,83 @@ import asyncio
 import logging
 import math
 import random
+import stat
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import AsyncIterator, Optional
+from typing import Any, AsyncIterator, Optional
+
+from .base import BaseSensor
 
 try:
-    from src.lego_cam.sensors.base import BaseSensor  # type: ignore
-except ImportError:
-    from lego_cam.sensors.base import BaseSensor
+    from smbus2 import SMBus  # type: ignore
+    from tmf882x import TMF882xException  # type: ignore
+
+    # Single-transaction result reads (see tmf882x_fast).
+    from .tmf882x_fast import FastTMF882x as TMF882x, closest_zone
+except Exception:  # pragma: no cover - import-time failure on non-Pi dev machines
+    # Simulation still works; the hardware paths check TMF882x is None.
+    SMBus = TMF882x = TMF882xException = closest_zone = None  # type: ignore
 
 
 log = logging.getLogger(__name__)
 
+# TMF8820 factory calibration blob, as written by scripts/calibrate_tmf8820.py.
+_CALIBRATION_SIZE = 188
+
+
+def _read_calibration(path: Path) -> tuple[Optional[bytes], str]:
+    """
+    (blob, "") for a regular file of _CALIBRATION_SIZE bytes, else (None, reason).
+    One stat covers existence, type and size, so a bad file is rejected unread.
+    """
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None, "not found"
+    except OSError as e:
+        return None, f"not accessible ({e.strerror})"
+    if not stat.S_ISREG(st.st_mode):
+        return None, "is not a regular file"
+    if st.st_size != _CALIBRATION_SIZE:
+        return None, f"has wrong size ({st.st_size} bytes, need {_CALIBRATION_SIZE})"
+    try:
+        return path.read_bytes(), ""
+    except OSError as e:
+        return None, f"not readable ({e.strerror})"
+
+
+def _alpha_shift(alpha: float) -> Optional[int]:
+    """k when alpha == 1/2**k (0 < alpha < 1), so the EMA can run as integer shifts; else None."""
+    if not 0.0 < alpha < 1.0:
+        return None
+    mantissa, exponent = math.frexp(alpha)
+    return 1 - exponent if mantissa == 0.5 else None
+
+
+def _open_int_pin(
+    gpio: int, loop: asyncio.AbstractEventLoop
+) -> tuple[Any, Optional[asyncio.Event]]:
+    """
+    Watch the TMF8820 INT line (open drain, active low) on BCM gpio. Returns
+    (pin, event set on each falling edge), or (None, None) to fall back to polling.
+    """
+    try:
+        from gpiozero import DigitalInputDevice  # type: ignore
+    except ImportError:
+        log.warning("TMF8820 int_gpio=%s needs gpiozero; polling instead", gpio)
+        return None, None
+    try:
+        pin = DigitalInputDevice(gpio, pull_up=True)
+    except Exception as e:
+        log.warning("TMF8820 INT pin GPIO%s unavailable (%s); polling instead", gpio, e)
+        return None, None
+    ready = asyncio.Event()
+    # gpiozero calls back on its own thread.
+    pin.when_activated = lambda: loop.call_soon_threadsafe(ready.set)
+    return pin, ready
+
 
 async def check_tof_health(
     i2c_bus: int = 1,
@@ -27,40 +91,40 @@ async def check_tof_health(
     """Quick ToF health check. Returns (success, message). Does NOT touch the camera."""
     if simulate:
         return (True, "ToF OK (simulate)")
-    try:
-        from smbus2 import SMBus  # type: ignore
-        from tmf882x import TMF882x, TMF882xException  # type: ignore
-    except Exception:
+    if TMF882x is None:
         return (False, "ToF FAILED: tmf882x-driver or smbus2 not installed")
     bus = None
     try:
-        bus = SMBus(i2c_bus)
+        # The driver calls block (enable loads firmware, measure polls the status
+        # register), so they run on a worker thread to keep the event loop free.
+        bus = await asyncio.to_thread(SMBus, i2c_bus)
         await asyncio.sleep(1.0)
         tof = TMF882x(bus, address=i2c_address)
-        tof.enable()
+        await asyncio.to_thread(tof.enable)
         await asyncio.sleep(1.0)
         if calibration_file:
-            cal_path = Path(calibration_file)
-            if cal_path.exists():
-                cal_bytes = cal_path.read_bytes()
-                if len(cal_bytes) == 188:
-                    tof.write_calibration(cal_bytes)
+            cal_bytes, _ = _read_calibration(Path(calibration_file))
+            if cal_bytes is not None:
+                await asyncio.to_thread(tof.write_calibration, cal_bytes)
         elif not getattr(tof, "calibration_ok", True):
             try:
-                tof.calibrate()
+                await asyncio.to_thread(tof.calibrate)
             except TMF882xException:
                 pass
+        # Up to 12 attempts, but stop as soon as the verdict is known.
+        ok_needed = 2
         ok_count = 0
         for _ in range(12):
             try:
-                m = tof.measure()
-                if m.results and any(r.distance > 0 for r in m.results):
+                if closest_zone(await asyncio.to_thread(tof.measure_frame))[1]:
                     ok_count += 1
+                    if ok_count >= ok_needed:
+                        break
             except TMF882xException:
                 pass
             await asyncio.sleep(0.05)
-        tof.standby()
-        if ok_count >= 2:
+        await asyncio.to_thread(tof.standby)
+        if ok_count >= ok_needed:
             return (True, "ToF OK")
         return (False, "ToF FAILED: no reliable readings")
     except OSError as e:
@@ -94,37 +158,67 @@ class ToFSensor(BaseSensor):
     i2c_address: int = 0x41
     min_confidence: int = 5
     calibration_file: str = ""
-    smooth_alpha: float = 0.25  # EMA: 0=off, 0.2-0.4=moderate
+    smooth_alpha: float = 0.25  # EMA: 0=off, 0.2-0.4=moderate; 1/2**k uses integer fixed point
     hysteresis_mm: float = 80.0  # motion = distance change >= this (mm); increase to reduce false triggers
     confirm_ms: float = 0.0  # require change to persist this many ms (high-freq samples); 0 = no persistence
+    int_gpio: int = 0  # BCM GPIO wired to the TMF8820 INT pin; 0 = poll the status register
     # For developer-mode status display: most recent distance estimate in mm (if available).
     debug_distance_mm: Optional[float] = None
 
     # When confirm_ms > 0 we sample at this rate to check persistence (samples per second)
     CONFIRM_POLL_HZ: int = 50
 
-    async def events(self) -> AsyncIterator[bool]:
+    # Derived from the settings above in __post_init__.
+    _period: float = 0.0  # 1 / poll_hz
+    _confirm_period: float = 0.0  # loop period: 1 / CONFIRM_POLL_HZ when confirm_ms > 0
+    _required_consecutive: int = 1  # samples a change must persist for
+    _smooth_shift: Optional[int] = None  # k when smooth_alpha == 1/2**k
+
+    def __post_init__(self) -> None:
         if self.poll_hz <= 0:
             raise ValueError("poll_hz must be > 0")
+        self._period = 1.0 / float(self.poll_hz)
+        if self.confirm_ms > 0:
+            self._confirm_period = 1.0 / self.CONFIRM_POLL_HZ
+            self._required_consecutive = max(
+                1, math.ceil(self.confirm_ms / 1000.0 * self.CONFIRM_POLL_HZ)
+            )
+        else:
+            self._confirm_period = self._period
+            self._required_consecutive = 1
+        self._smooth_shift = _alpha_shift(float(self.smooth_alpha))
 
-        period = 1.0 / float(self.poll_hz)
+    async def events(self) -> AsyncIterator[bool]:
+        period = self._period
 
         if self.simulate:
             # Simulation mode with a simple "distance" model and hysteresis.
             #
             # We keep a virtual distance in mm and only emit a motion event
-            # when the distance changes by >= 40mm relative to the last stable
+            # when the distance changes by >= hysteresis_mm relative to the last stable
             # value. This approximates "only significant movements".
             log.warning(
                 "TMF8820 SIMULATION ACTIVE — distance is fake. Set sensor.simulate=false in config for real sensor."
             )
-            log.info("ToF sensor simulation enabled (poll_hz=%s, hysteresis=±40mm)", self.poll_hz)
+            log.info(
+                "ToF sensor simulation enabled (poll_hz=%s, hysteresis=±%.0fmm)",
+                self.poll_hz,
+                self.hysteresis_mm,
+            )
             baseline_mm = 600.0
             stable_mm = baseline_mm
             current_mm = baseline_mm
 
+            loop = asyncio.get_running_loop()
+            next_tick = loop.time()
+            debug_enabled = log.isEnabledFor(logging.DEBUG)
             while True:
-                await asyncio.sleep(period)
+                # Fixed-rate ticks (see the hardware loop below).
+                next_tick += period
+                now = loop.time()
+                if next_tick < now - period:
+                    next_tick = now
+                await asyncio.sleep(next_tick - now)
 
                 # Small jitter (sensor noise / tiny movements).
                 jitter = random.uniform(-5.0, 5.0)
@@ -132,19 +226,17 @@ class ToFSensor(BaseSensor):
                 self.debug_distance_mm = current_mm
 
                 if abs(current_mm - stable_mm) >= self.hysteresis_mm:
-                    log.debug(
-                        "Simulated ToF motion event: %.1fmm -> %.1fmm", stable_mm, current_mm
-                    )
+                    if debug_enabled:
+                        log.debug(
+                            "Simulated ToF motion event: %.1fmm -> %.1fmm", stable_mm, current_mm
+                        )
                     stable_mm = current_mm
                     yield True
                 # otherwise: no event
             return
 
         # Real hardware path: SparkFun TMF8820 via tmf882x-driver.
-        try:
-            from smbus2 import SMBus  # type: ignore
-            from tmf882x import TMF882x, TMF882xException  # type: ignore
-        except Exception:  # pragma: no cover - import-time failure on non-Pi dev machines
+        if TMF882x is None:
             log.error(
                 "TMF8820 backend requested but tmf882x-driver or smbus2 is not installed. "
                 "Install with: pip install tmf882x-driver  "
@@ -154,12 +246,8 @@ class ToFSensor(BaseSensor):
                 await asyncio.sleep(period)
                 # No events; configuration is invalid.
 
-        confirm_period = 1.0 / self.CONFIRM_POLL_HZ if self.confirm_ms > 0 else period
-        required_consecutive = (
-            max(1, math.ceil(self.confirm_ms / 1000.0 * self.CONFIRM_POLL_HZ))
-            if self.confirm_ms > 0
-            else 1
-        )
+        confirm_period = self._confirm_period
+        required_consecutive = self._required_consecutive
         log.info(
             "TMF8820 hardware mode (bus=%s, addr=0x%02X, hysteresis=±%.0fmm, smooth_alpha=%s, confirm_ms=%s → %s consecutive at %sHz)",
             self.i2c_bus,
@@ -173,11 +261,18 @@ class ToFSensor(BaseSensor):
 
         bus: SMBus | None = None
         tof: TMF882x | None = None
-        baseline_mm: Optional[float] = None
-        stable_mm: Optional[float] = None
+        int_pin = None  # gpiozero input on the INT line, when int_gpio > 0
+        # Blocking driver calls run here: one worker keeps bus access serialized, so the
+        # teardown in the finally queues behind a measurement still in flight when the
+        # task is cancelled, instead of touching the bus concurrently.
+        i2c = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tof-i2c")
+        loop = asyncio.get_running_loop()
+        stable_mm: Optional[float] = None  # reference distance; None until the first reading
 
         I2C_RETRIES = 3
-        I2C_RETRY_DELAY = 1.5
+        I2C_RETRY_BASE_DELAY = 0.1  # doubles per retry: 0.1s, 0.2s, ...
+        I2C_RETRY_MAX_DELAY = 2.0
+        I2C_TEARDOWN_TIMEOUT = 3.0
 
         def _raise_i2c_hint(e: OSError, after_retries: bool = False) -> None:
             if getattr(e, "errno", None) == 121:
@@ -203,11 +298,12 @@ class ToFSensor(BaseSensor):
                         except Exception:
                             pass
                         bus = None
-                    log.info("TMF8820 I2C retry %s/%s in %.1fs...", attempt, I2C_RETRIES, I2C_RETRY_DELAY)
-                    await asyncio.sleep(I2C_RETRY_DELAY)
+                    delay = min(I2C_RETRY_MAX_DELAY, I2C_RETRY_BASE_DELAY * 2 ** (attempt - 2))
+                    log.info("TMF8820 I2C retry %s/%s in %.1fs...", attempt, I2C_RETRIES, delay)
+                    await asyncio.sleep(delay)
 
                 try:
-                    bus = SMBus(self.i2c_bus)
+                    bus = await loop.run_in_executor(i2c, SMBus, self.i2c_bus)
                 except OSError as e:
                     last_err = e
                     continue
@@ -215,7 +311,7 @@ class ToFSensor(BaseSensor):
                 await asyncio.sleep(1.0)
                 tof = TMF882x(bus, address=self.i2c_address)
                 try:
-                    tof.enable()
+                    await loop.run_in_executor(i2c, tof.enable)
                     last_err = None
                     break
                 except OSError as e:
@@ -231,33 +327,30 @@ class ToFSensor(BaseSensor):
 
             if self.calibration_file:
                 cal_path = Path(self.calibration_file)
-                if cal_path.exists():
-                    cal_bytes = cal_path.read_bytes()
-                    if len(cal_bytes) == 188:
-                        tof.write_calibration(cal_bytes)
-                        log.info("TMF8820 loaded calibration from %s", cal_path)
-                    else:
-                        log.warning(
-                            "TMF8820 calibration file %s has wrong size (%s bytes, need 188); skipping",
-                            cal_path,
-                            len(cal_bytes),
-                        )
+                cal_bytes, problem = _read_calibration(cal_path)
+                if cal_bytes is not None:
+                    await loop.run_in_executor(i2c, tof.write_calibration, cal_bytes)
+                    log.info("TMF8820 loaded calibration from %s", cal_path)
                 else:
-                    log.warning("TMF8820 calibration file not found: %s", cal_path)
+                    log.warning("TMF8820 calibration file %s %s; skipping", cal_path, problem)
             else:
                 # Match working code: calibrate at runtime if not OK (no file needed)
                 if not getattr(tof, "calibration_ok", True):
                     log.info("TMF8820 calibrating...")
                     try:
-                        tof.calibrate()
+                        await loop.run_in_executor(i2c, tof.calibrate)
                         log.info("TMF8820 calibration done")
                     except TMF882xException as e:
                         log.warning("TMF8820 calibration failed: %s", e)
                 else:
                     log.info("TMF8820 calibration OK (no file)")
 
-            smoothed_mm: Optional[float] = None
-            first_sample_logged = False
+            smoothed_mm: float = 0.0
+            alpha = float(self.smooth_alpha)
+            # Power-of-two alpha (e.g. the default 0.25): fixed-point EMA on integer mm,
+            # accumulator scaled by 2**shift, one add and two shifts per sample.
+            shift = self._smooth_shift
+            ema_shifted = 0
             consecutive_above = 0  # for persistence check
             # Rate-limit repeated measurement errors (e.g. "Command failed with status 9")
             last_measure_err_msg: Optional[str] = None
@@ -286,10 +379,57 @@ class ToFSensor(BaseSensor):
                     )
                     last_measure_err_log_time = now
 
+            # INT-driven mode: the sensor ranges continuously and pulls INT low per result;
+            # the loop waits on that edge instead of ticking and polling the status register.
+            ready: Optional[asyncio.Event] = None
+            if self.int_gpio > 0:
+                int_pin, ready = _open_int_pin(self.int_gpio, loop)
+            if ready is not None:
+                period_ms = max(1, round(confirm_period * 1000))
+                await loop.run_in_executor(i2c, tof.start_continuous, period_ms)
+                log.info("TMF8820 continuous ranging every %sms on INT (GPIO%s)", period_ms, self.int_gpio)
+            # A missed edge leaves INT held low; reading the frame after a timeout releases it.
+            int_timeout = max(0.5, 4 * confirm_period)
+            int_timeouts = 0
+
+            # Per-tick lookups bound once.
+            measure_frame = tof.measure_frame if ready is None else tof.read_frame
+            wait_for = asyncio.wait_for
+            run_in_executor = loop.run_in_executor
+            sleep = asyncio.sleep
+            # Raw and fixed-point readings are whole mm, so they stay ints end to end and
+            # compare against the threshold rounded up (same verdict for integer deltas).
+            int_mm = shift is not None or alpha <= 0
+            hysteresis_mm = math.ceil(self.hysteresis_mm) if int_mm else self.hysteresis_mm
+            debug_enabled = log.isEnabledFor(logging.DEBUG)
+            loop_time = loop.time
+            next_tick = loop_time()
             while True:
-                await asyncio.sleep(confirm_period)
+                if ready is not None:
+                    try:
+                        await wait_for(ready.wait(), int_timeout)
+                    except TimeoutError:
+                        int_timeouts += 1
+                        if int_timeouts == 1 or int_timeouts % 100 == 0:
+                            log.warning(
+                                "TMF8820 no INT edge on GPIO%s within %.1fs (%s times); check wiring",
+                                self.int_gpio,
+                                int_timeout,
+                                int_timeouts,
+                            )
+                    ready.clear()
+                else:
+                    # Fixed-rate ticks: the measurement time is absorbed into the wait
+                    # instead of stretching the period. After a stall longer than a period
+                    # (recovery, retries) restart the schedule rather than bursting to
+                    # catch up; a late tick still yields via sleep(<=0).
+                    next_tick += confirm_period
+                    now = loop_time()
+                    if next_tick < now - confirm_period:
+                        next_tick = now
+                    await sleep(next_tick - now)
                 try:
-                    m = tof.measure()
+                    frame = await run_in_executor(i2c, measure_frame)
                     consecutive_measure_errors = 0
                 except TMF882xException as e:
                     consecutive_measure_errors += 1
@@ -301,10 +441,12 @@ class ToFSensor(BaseSensor):
                             consecutive_measure_errors,
                         )
                         try:
-                            tof.standby()
+                            await loop.run_in_executor(i2c, tof.standby)
                             await asyncio.sleep(0.5)
-                            tof.enable()
+                            await loop.run_in_executor(i2c, tof.enable)
                             await asyncio.sleep(0.5)
+                            if ready is not None:
+                                await loop.run_in_executor(i2c, tof.start_continuous, period_ms)
                             consecutive_measure_errors = 0
                         except Exception as rec:
                             log.warning("TMF8820 recovery failed: %s", rec)
@@ -316,48 +458,48 @@ class ToFSensor(BaseSensor):
                     continue
 
                 # Match your working code: accept all distances > 0, use closest (min).
-                distances = [float(r.distance) for r in m.results if r.distance > 0]
+                # Reduced straight from the raw page; no per-zone result objects.
+                closest, zones = closest_zone(frame)
 
-                if not distances:
+                if not zones:
                     continue
 
-                raw_mm = min(distances)  # closest object, same as your code
-
-                if self.smooth_alpha > 0 and smoothed_mm is not None:
-                    current_mm = self.smooth_alpha * raw_mm + (1.0 - self.smooth_alpha) * smoothed_mm
-                    smoothed_mm = current_mm
-                else:
-                    current_mm = raw_mm
-                    smoothed_mm = raw_mm
-
-                self.debug_distance_mm = current_mm
-
-                if not first_sample_logged:
-                    first_sample_logged = True
+                if stable_mm is None:
+                    # First reading: seed the filter and the reference distance.
+                    ema_shifted = closest << shift if shift is not None else 0
+                    smoothed_mm = current_mm = stable_mm = closest
+                    self.debug_distance_mm = current_mm
                     log.info(
                         "TMF8820 first sample: distance_mm=%.1f (%s zones with d>0)",
                         current_mm,
-                        len(distances),
+                        zones,
                     )
-
-                if baseline_mm is None:
-                    baseline_mm = current_mm
-                    stable_mm = current_mm
                     continue
 
-                if stable_mm is None:
-                    stable_mm = current_mm
-                    continue
+                if shift is not None:
+                    ema_shifted += closest - (ema_shifted >> shift)
+                    current_mm = ema_shifted >> shift
+                elif alpha > 0:
+                    # EMA in incremental form: one multiply, same result.
+                    current_mm = smoothed_mm + alpha * (closest - smoothed_mm)
+                    smoothed_mm = current_mm
+                else:
+                    # closest object, same as your code
+                    current_mm = closest
 
-                if abs(current_mm - stable_mm) >= self.hysteresis_mm:
+                self.debug_distance_mm = current_mm
+
+                delta = current_mm - stable_mm
+                if delta >= hysteresis_mm or -delta >= hysteresis_mm:
                     consecutive_above += 1
                     if consecutive_above >= required_consecutive:
-                        log.debug(
-                            "TMF8820 motion event (confirmed %s samples): %.1fmm -> %.1fmm",
-                            required_consecutive,
-                            stable_mm,
-                            current_mm,
-                        )
+                        if debug_enabled:
+                            log.debug(
+                                "TMF8820 motion event (confirmed %s samples): %.1fmm -> %.1fmm",
+                                required_consecutive,
+                                stable_mm,
+                                current_mm,
+                            )
                         stable_mm = current_mm
                         consecutive_above = 0
                         yield True
@@ -365,16 +507,38 @@ class ToFSensor(BaseSensor):
                     consecutive_above = 0
                 # otherwise: no event yet or reset
         finally:
-            try:
-                if tof is not None:
+            steps = []
+            if tof is not None:
+                if int_pin is not None:
+                    steps.append(tof.stop_continuous)
+                steps.append(tof.standby)
+            if bus is not None:
+                steps.append(bus.close)
+
+            def _teardown() -> None:
+                for step in steps:
                     try:
-                        tof.standby()
+                        step()
                     except Exception:
                         pass
+
+            try:
+                # Awaited on the worker, never joined on the loop: a stalled I2C
+                # transaction delays only this task's exit, by at most the timeout.
+                if steps:
+                    await asyncio.wait_for(
+                        loop.run_in_executor(i2c, _teardown), I2C_TEARDOWN_TIMEOUT
+                    )
+            except TimeoutError:
+                log.warning(
+                    "TMF8820 teardown still running after %.0fs (I2C stalled); not waiting for it",
+                    I2C_TEARDOWN_TIMEOUT,
+                )
             finally:
-                if bus is not None:
+                i2c.shutdown(wait=False)
+                if int_pin is not None:
                     try:
-                        bus.close()
+                        int_pin.close()
                     except Exception:
                         pass
 
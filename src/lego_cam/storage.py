@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import logging
-import shutil
+import os
 from dataclasses import dataclass
 from pathlib import Path
 
@@ -9,45 +9,59 @@ from pathlib import Path
 log = logging.getLogger(__name__)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class StorageManager:
     output_dir: Path
     min_free_mb: int
 
-    def ensure_free_space(self) -> None:
+    def ensure_free_space(self) -> int:
         """
         Ensure at least min_free_mb is available on the filesystem holding output_dir.
         Deletes oldest files until the threshold is met or nothing remains.
+        Returns the free space in MB after pruning.
         """
         self.output_dir.mkdir(parents=True, exist_ok=True)
-        while self._free_mb() < self.min_free_mb:
-            oldest = self._oldest_video()
-            if oldest is None:
-                log.warning(
-                    "Low disk space (free=%dMB) but no files to delete",
-                    self._free_mb(),
-                )
-                return
+        free = self._free_mb()
+        if free >= self.min_free_mb:
+            log.debug("Disk space OK (free=%dMB, min=%dMB)", free, self.min_free_mb)
+            return free
+        # One listing, oldest first; only the free space is re-read after each delete.
+        for oldest in self.list_segments():
             try:
                 log.warning("Deleting oldest segment to free space: %s", oldest)
                 oldest.unlink(missing_ok=True)
             except Exception:
                 log.exception("Failed deleting %s", oldest)
-                return
-        log.debug("Disk space OK (free=%dMB, min=%dMB)", self._free_mb(), self.min_free_mb)
+                return free
+            free = self._free_mb()
+            if free >= self.min_free_mb:
+                log.debug("Disk space OK (free=%dMB, min=%dMB)", free, self.min_free_mb)
+                return free
+        log.warning("Low disk space (free=%dMB) but no files to delete", free)
+        return free
 
     def list_segments(self) -> list[Path]:
-        if not self.output_dir.exists():
+        # scandir: one directory read, with is_file() answered from the entry type.
+        vids: list[tuple[float, Path]] = []
+        try:
+            with os.scandir(self.output_dir) as it:
+                for e in it:
+                    if not (e.name.endswith(".mp4") and e.is_file()):
+                        continue
+                    try:
+                        mtime = e.stat().st_mtime
+                    except FileNotFoundError:
+                        # Deleted mid-scan (pruner or ffmpeg); the rest still counts.
+                        continue
+                    vids.append((mtime, Path(e.path)))
+        except FileNotFoundError:
             return []
-        vids = [p for p in self.output_dir.glob("*.mp4") if p.is_file()]
-        vids.sort(key=lambda p: p.stat().st_mtime)
-        return vids
-
-    def _oldest_video(self) -> Path | None:
-        segs = self.list_segments()
-        return segs[0] if segs else None
+        vids.sort()
+        return [p for _, p in vids]
 
     def _free_mb(self) -> int:
-        usage = shutil.disk_usage(self.output_dir)
-        return int(usage.free // (1024 * 1024))
+        # Same figure as shutil.disk_usage().free (blocks available to non-root),
+        # without computing the total/used fields.
+        st = os.statvfs(self.output_dir)
+        return (st.f_bavail * st.f_frsize) >> 20
 
@@ -0,0 +1,133 @@
+import asyncio
+import io
+import os
+import socket
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from lego_cam.camera import picamera2_recorder  # noqa: E402
+from lego_cam.camera.picamera2_recorder import Picamera2Recorder, _PipeWriter  # noqa: E402
+
+try:
+    from picamera2.outputs import FileOutput  # type: ignore
+except ImportError:
+
+    class FileOutput:
+        """Stand-in with the same type check as picamera2.outputs.FileOutput."""
+
+        def __init__(self, file=None):
+            if isinstance(file, (str, Path)):
+                raise AssertionError("stub does not open paths")
+            if isinstance(file, io.BufferedIOBase) or isinstance(file, socket.SocketIO):
+                self.fileoutput = file
+            else:
+                raise RuntimeError("Must pass io.BufferedIOBase")
+
+
+class PipeWriterTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.read_fd, write_fd = os.pipe()
+        self.writer = _PipeWriter(write_fd)
+
+    def tearDown(self) -> None:
+        self.writer.close()
+        if self.read_fd is not None:
+            os.close(self.read_fd)
+        self.writer.join(3.0)
+
+    def test_accepted_by_file_output(self) -> None:
+        out = FileOutput(self.writer)
+        self.assertIs(out.fileoutput, self.writer)
+        self.assertTrue(self.writer.writable())
+
+    def test_raw_unbuffered_fd_is_rejected(self) -> None:
+        # What bufsize=0 Popen stdin / os.fdopen(..., buffering=0) hand back.
+        r, w = os.pipe()
+        os.close(r)
+        with os.fdopen(w, "wb", buffering=0) as raw, self.assertRaises(RuntimeError):
+            FileOutput(raw)
+
+    def test_close_delivers_queued_frames(self) -> None:
+        frames = [b"\x00\x00\x00\x01\x67" + bytes(100), b"\x00\x00\x00\x01\x41" + bytes(50)]
+        for frame in frames:
+            self.assertEqual(self.writer.write(frame), len(frame))
+        self.writer.flush()
+        self.writer.close()
+        self.assertTrue(self.writer.closed)
+        received = b""
+        while chunk := os.read(self.read_fd, 65536):
+            received += chunk
+        self.assertEqual(received, b"".join(frames))
+        self.assertTrue(self.writer.join(3.0))
+
+    def test_close_does_not_close_fd_under_blocked_write(self) -> None:
+        fd = self.writer._fd
+        # More than the pipe buffer, so the writer thread blocks in os.write.
+        self.writer.write(b"\x00\x00\x00\x01\x67" + bytes(1 << 20))
+        self.writer.close()
+        self.assertFalse(self.writer.join(0.2))
+        os.fstat(fd)  # still ours: closing it here could hand the number to another file
+        # What terminating ffmpeg does: the blocked write fails with EPIPE.
+        os.close(self.read_fd)
+        self.read_fd = None
+        self.assertTrue(self.writer.join(3.0))
+        with self.assertRaises(OSError):
+            os.fstat(fd)
+
+
+class _FailingCamera:
+    def start(self) -> None:
+        pass
+
+    def start_recording(self, encoder, output) -> None:
+        raise RuntimeError("encoder failed to start")
+
+
+def _open_fds() -> int:
+    return len(os.listdir("/proc/self/fd"))
+
+
+@unittest.skipUnless(os.path.isdir("/proc/self/fd"), "needs /proc fd listing")
+class FfmpegStartFailureTest(unittest.IsolatedAsyncioTestCase):
+    async def test_failed_encoder_start_tears_down_ffmpeg(self) -> None:
+        real_exec = asyncio.create_subprocess_exec
+        spawned = []
+
+        async def fake_ffmpeg(*cmd, **kwargs):
+            # Stands in for ffmpeg: reads stdin until EOF.
+            proc = await real_exec(
+                sys.executable, "-c", "import sys; sys.stdin.buffer.read()", **kwargs
+            )
+            spawned.append(proc)
+            return proc
+
+        with tempfile.TemporaryDirectory() as tmp:
+            recorder = Picamera2Recorder(
+                output_dir=Path(tmp),
+                width=640,
+                height=480,
+                fps=30,
+                rotation_mode="ffmpeg_segment",
+                segment_seconds=30,
+            )
+            recorder._picam2 = _FailingCamera()
+            recorder._encoder = object()
+            before = _open_fds()
+            with mock.patch.object(picamera2_recorder.asyncio, "create_subprocess_exec", fake_ffmpeg):
+                with self.assertRaises(RuntimeError):
+                    await recorder._start_ffmpeg_segmenting(FileOutput)
+
+            self.assertIsNone(recorder._ffmpeg_proc)
+            self.assertIsNone(recorder._ffmpeg_stdin)
+            self.assertIsNone(recorder._ffmpeg_stderr_task)
+            self.assertIsNotNone(spawned[0].returncode)
+            self.assertEqual(_open_fds(), before)
+
+
+if __name__ == "__main__":
+    unittest.main()